@@ -4,10 +4,21 @@
 import argparse
 import json
 import os
-import re
+import sys
 import time
 from typing import Dict, Any, Optional, Tuple, List
 
+from batching import DEFAULT_MAX_BATCH_ITEMS, DEFAULT_TARGET_LATENCY_SEC, DEFAULT_TOKEN_BUDGET, TokenBudget, bisect_recover, local_key, row_tokens, wire_rows
+from do_not_translate import DoNotTranslate, is_non_translatable, load_do_not_translate
+from json_stream import report_lost, salvage_json_array
+from openai_http import ChatSession, RateLimiter, chat_completion
+from run_manifest import RunManifest
+from run_metrics import RunMetrics
+from translation_memory import TranslationMemory, source_tuple
+
+DEFAULT_CACHE_FILE = "ps_cache.json"
+DEFAULT_MANIFEST_FILE = "ps_manifest.json"
+
 
 def load_json(path: str):
     with open(path, "r", encoding="utf-8") as f:
@@ -20,49 +31,6 @@ def save_json(path: str, data):
         f.write("\n")
 
 
-def load_do_not_translate(path: Optional[str]) -> Dict[str, Any]:
-    if not path or not os.path.exists(path):
-        return {"exact": [], "prefix": [], "regex": []}
-    cfg = load_json(path)
-    return {
-        "exact": cfg.get("exact", []),
-        "prefix": cfg.get("prefix", []),
-        "regex": cfg.get("regex", []),
-    }
-
-
-def is_non_translatable(word: str, item: Dict[str, Any], dnt: Dict[str, Any]) -> bool:
-    if item.get("dont_translate") is True:
-        return True
-
-    w = (word or "").strip()
-    if not w:
-        return True
-
-    if w in dnt["exact"]:
-        return True
-
-    for p in dnt["prefix"]:
-        if w.startswith(p):
-            return True
-
-    for rgx in dnt["regex"]:
-        try:
-            if re.search(rgx, w):
-                return True
-        except re.error:
-            pass
-
-    if any(ch.isdigit() for ch in w):
-        return True
-    if "@" in w or w.startswith("http"):
-        return True
-    if re.fullmatch(r"[A-ZÄÖÜ]{2,}", w):
-        return True
-
-    return False
-
-
 def load_cache(path: str) -> Dict[str, str]:
     if os.path.exists(path):
         try:
@@ -75,6 +43,8 @@ def load_cache(path: str) -> Dict[str, str]:
 
 
 def save_cache(path: str, cache: Dict[str, str]):
+    if not path:
+        return
     save_json(path, cache)
 
 
@@ -126,36 +96,31 @@ def call_openai_chat(
     timeout_sec: float,
     retries: int,
     retry_backoff_sec: float,
+    session: Optional[ChatSession] = None,
 ) -> str:
-    import urllib.request
-
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-    }
-
-    req = urllib.request.Request(
-        "https://api.openai.com/v1/chat/completions",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
+    if session is None:
+        with ChatSession() as one_shot:
+            return call_openai_chat(
+                api_key=api_key,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                timeout_sec=timeout_sec,
+                retries=retries,
+                retry_backoff_sec=retry_backoff_sec,
+                session=one_shot,
+            )
+    return chat_completion(
+        session,
+        api_key=api_key,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        timeout_sec=timeout_sec,
+        retries=retries,
+        retry_backoff_sec=retry_backoff_sec,
     )
 
-    attempt = 0
-    while True:
-        try:
-            with urllib.request.urlopen(req, timeout=timeout_sec) as r:
-                res = json.loads(r.read().decode("utf-8"))
-            return res["choices"][0]["message"]["content"]
-        except Exception:
-            attempt += 1
-            if attempt > retries:
-                raise
-            time.sleep(retry_backoff_sec * attempt)
-
 
 def translate_to_pashto_single(
     *,
@@ -167,6 +132,7 @@ def translate_to_pashto_single(
     timeout_sec: float,
     retries: int,
     retry_backoff_sec: float,
+    session: Optional[ChatSession] = None,
 ) -> str:
     content = call_openai_chat(
         api_key=api_key,
@@ -189,21 +155,11 @@ def translate_to_pashto_single(
         timeout_sec=timeout_sec,
         retries=retries,
         retry_backoff_sec=retry_backoff_sec,
+        session=session,
     )
     return content.strip().strip('"').strip("'")
 
 
-def _extract_json(payload: str) -> Optional[str]:
-    s = payload.strip()
-    if s.startswith("[") and s.endswith("]"):
-        return s
-    start = s.find("[")
-    end = s.rfind("]")
-    if start != -1 and end != -1 and end > start:
-        return s[start : end + 1]
-    return None
-
-
 def translate_to_pashto_batch(
     *,
     api_key: str,
@@ -212,6 +168,7 @@ def translate_to_pashto_batch(
     timeout_sec: float,
     retries: int,
     retry_backoff_sec: float,
+    session: Optional[ChatSession] = None,
 ) -> Dict[str, str]:
     content = call_openai_chat(
         api_key=api_key,
@@ -229,34 +186,46 @@ def translate_to_pashto_batch(
             },
             {
                 "role": "user",
-                "content": json.dumps(items, ensure_ascii=False),
+                # Rows go out keyed by their position in the batch, not the cache key.
+                "content": json.dumps(wire_rows(items), ensure_ascii=False),
             },
         ],
         temperature=0.2,
         timeout_sec=timeout_sec,
         retries=retries,
         retry_backoff_sec=retry_backoff_sec,
+        session=session,
     )
 
-    json_text = _extract_json(content) or ""
-    data = json.loads(json_text)
+    metrics = session.metrics if session is not None else None
+    try:
+        data, clean = salvage_json_array(content)
+    except ValueError:
+        if metrics is not None:
+            metrics.count(rows_sent=len(items), parse_failures=1)
+        raise
+    keys = [row["key"] for row in items]
     out: Dict[str, str] = {}
-    if isinstance(data, list):
-        for row in data:
-            if not isinstance(row, dict):
-                continue
-            key = str(row.get("key", "") or "").strip()
-            ps = str(row.get("ps", "") or "").strip().strip('"').strip("'")
-            if key and ps:
-                out[key] = ps
+    for row in data:
+        if not isinstance(row, dict):
+            continue
+        key = local_key(row.get("key", ""), keys)
+        ps = str(row.get("ps", "") or "").strip().strip('"').strip("'")
+        if key and ps:
+            out[key] = ps
+    lost = [key for key in keys if key not in out]
+    if not clean:
+        # Only the lost rows go back out, through bisect_recover's missing-rows resend.
+        report_lost(lost, len(items))
+    if metrics is not None:
+        metrics.count(rows_sent=len(items), rows_received=len(out), parse_failures=0 if clean else 1, rows_lost=0 if clean else len(lost))
     return out
 
 
 def process_file(
     path: str,
-    dnt: Dict[str, Any],
+    dnt: DoNotTranslate,
     cache: Dict[str, str],
-    sleep_sec: float,
     cache_path: str,
     api_key: str,
     model: str,
@@ -265,7 +234,12 @@ def process_file(
     timeout_sec: float,
     retries: int,
     retry_backoff_sec: float,
+    session: Optional[ChatSession] = None,
+    memory: Optional[TranslationMemory] = None,
+    budget: Optional[TokenBudget] = None,
+    manifest: Optional[RunManifest] = None,
 ) -> Tuple[int, int, int]:
+    start = manifest.cursor(path) if manifest is not None else 0
     data = load_json(path)
     if not isinstance(data, list):
         return 0, 0, 0
@@ -273,6 +247,7 @@ def process_file(
     changed = 0
     skipped = 0
     translated = 0
+    metrics = session.metrics if session is not None else None
 
     pending: List[Tuple[Dict[str, Any], str, str, str, str]] = []
 
@@ -300,73 +275,130 @@ def process_file(
         key = cache_key(item)
         if key in cache:
             item["translation_ps"] = cache[key]
+            if memory is not None:
+                memory.put(source_tuple(de, en, fa), "ps", cache[key])
             changed += 1
+            if metrics is not None:
+                metrics.count(cache_hits=1)
             continue
 
+        if memory is not None:
+            hit = memory.get(source_tuple(de, en, fa), "ps")
+            if hit:
+                item["translation_ps"] = hit
+                changed += 1
+                if metrics is not None:
+                    metrics.count(cache_hits=1)
+                continue
+
+        if metrics is not None:
+            metrics.count(cache_misses=1)
         pending.append((item, key, de, en, fa))
 
+    # Resume an interrupted pass at the batch it stopped at; items before the
+    # cursor that are still missing are retried on the next full pass.
+    all_pending = pending
+    position = {id(item): i for i, item in enumerate(data)}
+    pending = [entry for entry in pending if position[id(entry[0])] >= start]
+    # Without a cache or memory, results only survive once the level file is written.
+    durable = bool(cache_path) or memory is not None
+    cursor = start
+    reached_end = not pending
+
     if max_items_left == 0:
         max_items_left = 1_000_000_000
 
+    all_items = [{"key": key, "de": de, "en": en, "fa": fa} for _, key, de, en, fa in pending]
+    costs = [row_tokens(row, ("ps",)) for row in all_items] if budget is not None else []
+
     i = 0
     while i < len(pending) and max_items_left > 0:
-        chunk = pending[i : i + max(1, batch_size)]
+        size = budget.take(costs, i) if budget is not None else max(1, batch_size)
+        chunk = pending[i : i + size]
         chunk = chunk[:max_items_left]
+        request_items = all_items[i : i + len(chunk)]
         i += len(chunk)
         max_items_left -= len(chunk)
 
-        request_items = [{"key": key, "de": de, "en": en, "fa": fa} for _, key, de, en, fa in chunk]
         results: Dict[str, str] = {}
 
-        if len(request_items) == 1:
-            one = request_items[0]
-            results[one["key"]] = translate_to_pashto_single(
-                api_key=api_key,
-                model=model,
-                de=one["de"],
-                en=one["en"],
-                fa=one["fa"],
-                timeout_sec=timeout_sec,
-                retries=retries,
-                retry_backoff_sec=retry_backoff_sec,
-            )
-        else:
-            try:
-                results = translate_to_pashto_batch(
+        def send(batch: List[Dict[str, str]]):
+            if len(batch) == 1:
+                one = batch[0]
+                ps_one = translate_to_pashto_single(
                     api_key=api_key,
                     model=model,
-                    items=request_items,
+                    de=one["de"],
+                    en=one["en"],
+                    fa=one["fa"],
                     timeout_sec=timeout_sec,
                     retries=retries,
                     retry_backoff_sec=retry_backoff_sec,
+                    session=session,
                 )
-            except Exception:
-                results = {}
+                if ps_one:
+                    results[one["key"]] = ps_one
+                return
+            got = translate_to_pashto_batch(
+                api_key=api_key,
+                model=model,
+                items=batch,
+                timeout_sec=timeout_sec,
+                retries=retries,
+                retry_backoff_sec=retry_backoff_sec,
+                session=session,
+            )
+            for row in batch:
+                if got.get(row["key"], "").strip():
+                    results[row["key"]] = got[row["key"]].strip()
+
+        def missing(batch: List[Dict[str, str]]) -> List[Dict[str, str]]:
+            return [row for row in batch if row["key"] not in results]
+
+        started = time.monotonic()
+        failed = False
+        try:
+            send(request_items)
+        except Exception:
+            failed = True
+        if budget is not None and len(request_items) > 1:
+            budget.record(
+                tokens=sum(costs[i - len(chunk) : i]),
+                latency_sec=time.monotonic() - started,
+                ok=not failed and not missing(request_items),
+            )
+
+        # Split failed batches in halves instead of falling back to one call per item.
+        extra_calls = bisect_recover(request_items, send, missing)
+        if metrics is not None:
+            metrics.count(fallback_calls=extra_calls)
 
         for item, key, de, en, fa in chunk:
-            ps = results.get(key, "").strip()
+            ps = results.get(key, "")
             if not ps:
-                ps = translate_to_pashto_single(
-                    api_key=api_key,
-                    model=model,
-                    de=de,
-                    en=en,
-                    fa=fa,
-                    timeout_sec=timeout_sec,
-                    retries=retries,
-                    retry_backoff_sec=retry_backoff_sec,
-                )
+                # Left untranslated; the next run picks it up again.
+                continue
             item["translation_ps"] = ps
             cache[key] = ps
+            if memory is not None:
+                memory.put(source_tuple(de, en, fa), "ps", ps)
             changed += 1
             translated += 1
 
         save_cache(cache_path, cache)
+        if memory is not None:
+            memory.commit()
 
-        if sleep_sec:
-            time.sleep(sleep_sec)
+        cursor = position[id(chunk[-1][0])] + 1
+        reached_end = chunk[-1] is pending[-1]
+        if manifest is not None and durable:
+            manifest.checkpoint(path, cursor=cursor)
 
     save_json(path, data)
+    if manifest is not None:
+        complete = all(str(item.get("translation_ps", "")).strip() for item, _, _, _, _ in all_pending)
+        # A pass that reached the end starts over next time to retry its failures.
+        manifest.record(path, complete=complete, cursor=0 if reached_end else cursor)
     return changed, skipped, translated
 
 
@@ -374,57 +406,94 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dir", required=True, help="Path to assets/words")
     ap.add_argument("--do-not-translate", default=None)
-    ap.add_argument("--cache", default="ps_cache.json")
-    ap.add_argument("--sleep", type=float, default=0.1)
+    ap.add_argument("--cache", default=None, help=f"JSON cache file (default {DEFAULT_CACHE_FILE}, off with --memory unless given)")
+    ap.add_argument("--memory", default=None, help="Shared SQLite translation memory, e.g. translation_memory.sqlite3")
+    ap.add_argument("--sleep", type=float, default=0, help="Deprecated and ignored; pacing follows --rpm/--tpm and rate-limit headers")
     ap.add_argument("--api-key-file", default=None, help=f"Defaults to {DEFAULT_API_KEY_FILE} if present")
     ap.add_argument("--model", default=None, help="OpenAI model name (or set OPENAI_MODEL)")
-    ap.add_argument("--batch-size", type=int, default=10, help="Number of items per API call (fallbacks to single on errors)")
+    ap.add_argument("--batch-size", type=int, default=0, help="Fixed number of items per API call; 0 sizes batches by --token-budget")
+    ap.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Starting estimated prompt+completion tokens per API call")
+    ap.add_argument("--max-batch-items", type=int, default=DEFAULT_MAX_BATCH_ITEMS, help="Upper bound on items per adaptive batch")
+    ap.add_argument("--target-latency", type=float, default=DEFAULT_TARGET_LATENCY_SEC, help="Shrink the token budget when calls get slower than this")
     ap.add_argument("--max-items", type=int, default=0, help="Max translated items this run (0 = no limit)")
     ap.add_argument("--timeout", type=float, default=120.0, help="HTTP timeout seconds per request")
     ap.add_argument("--retries", type=int, default=3, help="Retry count for transient failures")
     ap.add_argument("--retry-backoff", type=float, default=1.0, help="Retry backoff base seconds")
+    ap.add_argument("--rpm", type=float, default=0, help="Requests per minute quota (0 = unlimited)")
+    ap.add_argument("--tpm", type=float, default=0, help="Tokens per minute quota (0 = unlimited)")
+    ap.add_argument("--pool-size", type=int, default=1, help="Max keep-alive HTTP connections")
+    ap.add_argument("--http2", action="store_true", help="Use HTTP/2 (requires httpx[http2])")
+    ap.add_argument("--metrics-json", default=None, help="Write a JSON summary of request metrics here at the end of the run")
+    ap.add_argument("--metrics-prom", default=None, help="Write the metrics as a Prometheus textfile (node_exporter textfile collector)")
+    ap.add_argument("--metrics-interval", type=float, default=0, help="Print a JSON metrics snapshot to stderr every N seconds")
+    ap.add_argument("--manifest", default=DEFAULT_MANIFEST_FILE, help="Run manifest used to skip finished files and resume interrupted ones (\"\" to disable)")
+    ap.add_argument("--rescan", action="store_true", help="Forget the run manifest state and scan every file")
     args = ap.parse_args()
 
     api_key = resolve_openai_api_key(args.api_key_file)
     model = args.model or os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
 
     dnt = load_do_not_translate(args.do_not_translate)
-    cache = load_cache(args.cache)
+    for err in dnt.errors:
+        print(f"Warning: skipping invalid do-not-translate regex {err}", file=sys.stderr)
+    memory = TranslationMemory(args.memory) if args.memory else None
+    cache_path = args.cache if args.cache is not None else ("" if memory is not None else DEFAULT_CACHE_FILE)
+    cache = load_cache(cache_path)
+    metrics = RunMetrics("add_pashto_to_words_folder")
+    metrics.start_live(args.metrics_interval)
+    session = ChatSession(pool_size=args.pool_size, http2=args.http2, limiter=RateLimiter(args.rpm, args.tpm), metrics=metrics)
+    budget = None
+    if args.batch_size <= 0:
+        budget = TokenBudget(args.token_budget, max_items=args.max_batch_items, target_latency_sec=args.target_latency)
+
+    manifest = RunManifest(args.manifest, "ps", reset=args.rescan) if args.manifest else None
 
     total_changed = 0
     total_skipped = 0
     max_items_left = args.max_items
 
-    for root, _, files in os.walk(args.dir):
-        for f in files:
-            if not f.endswith(".json"):
-                continue
-            path = os.path.join(root, f)
-            c, s, t = process_file(
-                path,
-                dnt,
-                cache,
-                args.sleep,
-                args.cache,
-                api_key,
-                model,
-                args.batch_size,
-                max_items_left,
-                args.timeout,
-                args.retries,
-                args.retry_backoff,
-            )
-            total_changed += c
-            total_skipped += s
-            if max_items_left:
-                max_items_left = max(0, max_items_left - t)
-                if max_items_left == 0:
-                    save_cache(args.cache, cache)
-                    print(f"Stopped (max-items reached). changed={total_changed}, skipped={total_skipped}")
-                    return
-
-    save_cache(args.cache, cache)
-    print(f"Done. changed={total_changed}, skipped={total_skipped}")
+    paths = [os.path.join(root, f) for root, _, files in os.walk(args.dir) for f in files if f.endswith(".json")]
+    stopped = False
+    for path in paths:
+        if manifest is not None and manifest.is_complete(path):
+            continue
+        c, s, t = process_file(
+            path,
+            dnt,
+            cache,
+            cache_path,
+            api_key,
+            model,
+            args.batch_size,
+            max_items_left,
+            args.timeout,
+            args.retries,
+            args.retry_backoff,
+            session=session,
+            memory=memory,
+            budget=budget,
+            manifest=manifest,
+        )
+        total_changed += c
+        total_skipped += s
+        if max_items_left:
+            max_items_left = max(0, max_items_left - t)
+            if max_items_left == 0:
+                stopped = True
+                break
+
+    save_cache(cache_path, cache)
+    if memory is not None:
+        memory.close()
+    session.close()
+    print(f"{'Stopped (max-items reached)' if stopped else 'Done'}. changed={total_changed}, skipped={total_skipped}")
+    print(session.format_stats())
+    if budget is not None:
+        print(budget.format_stats())
+    if manifest is not None:
+        print(manifest.format_stats())
+    print(metrics.format_stats())
+    metrics.export(json_path=args.metrics_json, prom_path=args.metrics_prom)
 
 
 if __name__ == "__main__":
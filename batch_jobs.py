@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Request and result files for the OpenAI Batch API.
+
+A batch input file holds one chat-completions request per line:
+
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+
+and the output file one line per finished request:
+
+    {"custom_id": "...", "response": {"status_code": 200, "body": {...}}, "error": null}
+
+Output lines come back in any order, so requests are matched by `custom_id`.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+
+def stable_id(prefix: str, payload: Any) -> str:
+    """A custom_id that only depends on `payload`, so re-emitting the same batch gives the same id."""
+    digest = hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'{prefix}-{digest[:20]}'
+
+
+def request_line(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}
+
+
+def write_jsonl(path: str, lines: Iterable[Dict[str, Any]]) -> int:
+    """Write `lines` as JSONL, atomically. Returns the number of lines."""
+    n = 0
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False))
+                f.write('\n')
+                n += 1
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return n
+
+
+def index_path(batch_path: str) -> str:
+    """Sidecar file that maps each custom_id of `batch_path` back to its rows."""
+    return os.path.splitext(batch_path)[0] + '.index.json'
+
+
+def read_results(path: str) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Yield (custom_id, message content, error) for every line of a batch
+    output (or error) file. Exactly one of content and error is set.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(rec, dict) or not rec.get('custom_id'):
+                continue
+            custom_id = str(rec['custom_id'])
+            error = rec.get('error')
+            response = rec.get('response') if isinstance(rec.get('response'), dict) else {}
+            status = response.get('status_code')
+            if error or status != 200:
+                message = error.get('message') if isinstance(error, dict) else error
+                yield custom_id, None, str(message or f'status {status}')
+                continue
+            try:
+                content = response['body']['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                yield custom_id, None, 'no message content'
+                continue
+            yield custom_id, str(content or ''), None
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_MIN_TOKEN_BUDGET = 300
+DEFAULT_MAX_TOKEN_BUDGET = 16000
+DEFAULT_MAX_BATCH_ITEMS = 60
+DEFAULT_TARGET_LATENCY_SEC = 20.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about four Latin characters per
+    token, and about two per token for Persian/Pashto and other non-ASCII text.
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return max(1, int(ascii_chars / 4 + other_chars / 2 + 0.999))
+
+
+def wire_rows(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """`rows` as sent: keys replaced by per-batch ordinals ("0", "1", ...), so cache keys never go on the wire."""
+    return [dict(row, key=str(i)) for i, row in enumerate(rows)]
+
+
+def local_key(wire_key: Any, keys: Sequence[str]) -> Optional[str]:
+    """The local key behind an ordinal echoed back by the model, or None if it is not one of the batch's."""
+    s = str(wire_key).strip()
+    if s.isdigit() and int(s) < len(keys):
+        return keys[int(s)]
+    return None
+
+
+def row_tokens(row: Dict[str, str], output_fields: Sequence[str]) -> int:
+    """Estimated prompt + completion tokens one row adds to a batch request (with its wire key)."""
+    wire = dict(row, key='00')
+    prompt = estimate_tokens(json.dumps(wire, ensure_ascii=False))
+    source = estimate_tokens(f"{row.get('de', '')} {row.get('en', '')}")
+    completion = estimate_tokens(json.dumps({'key': wire['key']}, ensure_ascii=False))
+    completion += len(output_fields) * (source + 4)
+    return prompt + completion
+
+
+class TokenBudget:
+    """
+    Adaptive per-request token budget used to cut batches.
+
+    The budget grows additively while requests succeed under
+    `target_latency_sec`, shrinks gently when they get slow, and is halved
+    (relative to the failing batch) when a request errors, comes back
+    truncated or is missing rows. Safe to share between worker threads.
+    """
+
+    def __init__(
+        self,
+        tokens: int = DEFAULT_TOKEN_BUDGET,
+        *,
+        min_tokens: int = DEFAULT_MIN_TOKEN_BUDGET,
+        max_tokens: int = DEFAULT_MAX_TOKEN_BUDGET,
+        max_items: int = DEFAULT_MAX_BATCH_ITEMS,
+        target_latency_sec: float = DEFAULT_TARGET_LATENCY_SEC,
+    ):
+        self.min_tokens = max(1, min_tokens)
+        self.max_tokens = max(self.min_tokens, max_tokens)
+        self.tokens = float(min(self.max_tokens, max(self.min_tokens, tokens)))
+        self.max_items = max(1, max_items)
+        self.target_latency_sec = target_latency_sec
+        self.step_tokens = max(50.0, self.tokens / 10)
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def take(self, costs: Sequence[int], start: int = 0) -> int:
+        """Number of rows from `costs[start:]` (at least one) that fit the current budget."""
+        with self._lock:
+            budget = self.tokens
+        used = 0
+        n = 0
+        for cost in costs[start:start + self.max_items]:
+            if n and used + cost > budget:
+                break
+            used += cost
+            n += 1
+        return max(1, n)
+
+    def count_batches(self, costs: Sequence[int]) -> int:
+        """Batches needed for `costs` at the current budget."""
+        i = 0
+        batches = 0
+        while i < len(costs):
+            i += self.take(costs, i)
+            batches += 1
+        return batches
+
+    def record(self, *, tokens: int, latency_sec: float, ok: bool):
+        with self._lock:
+            if not ok:
+                self.failures += 1
+                self.tokens = max(self.min_tokens, min(self.tokens, tokens) / 2)
+            elif latency_sec > self.target_latency_sec:
+                self.successes += 1
+                self.tokens = max(self.min_tokens, self.tokens * 0.8)
+            else:
+                self.successes += 1
+                # Only grow when batches actually use the budget; small tail
+                # batches say nothing about how large a request can get.
+                if tokens >= self.tokens / 2:
+                    self.tokens = min(self.max_tokens, self.tokens + self.step_tokens)
+
+    def format_stats(self) -> str:
+        with self._lock:
+            return f'Batching: token_budget={int(self.tokens)}, ok_batches={self.successes}, failed_batches={self.failures}'
+
+
+def bisect_recover(rows: List[Any], translate: Callable[[List[Any]], Any], missing: Callable[[List[Any]], List[Any]]) -> int:
+    """
+    Recover the rows of an already-sent batch that came back without a result.
+
+    `translate(batch)` sends a batch and records whatever it gets back (it may
+    raise); `missing(batch)` returns the rows still lacking a result. When
+    only some rows are missing they are resent together; when the whole batch
+    failed it is split in halves, so a bad row is isolated in O(log n) calls
+    while the healthy rows around it are still translated in bulk.
+
+    Returns the number of extra calls made.
+    """
+    left = missing(rows)
+    if not left or len(rows) == 1:
+        return 0
+    if len(left) < len(rows):
+        parts = [left]
+    else:
+        mid = len(rows) // 2
+        parts = [rows[:mid], rows[mid:]]
+
+    calls = 0
+    for part in parts:
+        calls += 1
+        try:
+            translate(part)
+        except Exception:
+            pass
+        calls += bisect_recover(part, translate, missing)
+    return calls
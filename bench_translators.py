@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end throughput benchmark for the translation scripts, run entirely
+offline against mock_openai_server.py:
+
+    python3 bench_translators.py --script fr_tr --latency-ms 300 --error-rate 0.02 -- --concurrency 4
+    python3 bench_translators.py --script ps --malformed-rate 0.05 -- --batch-size 20
+
+The level files are copied into a temporary directory with a share of the
+target translations removed, so the real assets are never touched. Anything
+after `--` is passed to the script unchanged.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from mock_openai_server import MockChatServer, add_config_args, config_from_args
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORDS_DIR = os.path.join(HERE, 'assets', 'words')
+SCRIPTS = {
+    'fr_tr': 'translate_words_fr_tr.py',
+    'ps': 'add_pashto_to_words_folder.py',
+}
+
+
+def level_files(words_dir: str, limit: int) -> List[str]:
+    files = sorted(f for f in os.listdir(words_dir) if f.endswith('.json'))
+    return files[:limit] if limit > 0 else files
+
+
+def prepare_fr_tr(words_dir: str, out_dir: str, files: List[str], strip_frac: float, rnd: random.Random) -> int:
+    pending = 0
+    for name in files:
+        with open(os.path.join(words_dir, name), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for item in data:
+            words = item.get('words')
+            if isinstance(words, dict) and rnd.random() < strip_frac:
+                words.pop('fr', None)
+                words.pop('tr', None)
+                pending += 1
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    return pending
+
+
+def prepare_ps(words_dir: str, out_dir: str, files: List[str], strip_frac: float, rnd: random.Random) -> int:
+    """add_pashto_to_words_folder.py reads the flat `word` / `translation_*` layout."""
+    pending = 0
+    for name in files:
+        with open(os.path.join(words_dir, name), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        out = []
+        for item in data:
+            words = item.get('words') or {}
+            row = {
+                'id': item.get('id', ''),
+                'word': words.get('de', ''),
+                'translation_en': words.get('en', ''),
+                'translation_fa': words.get('fa', ''),
+            }
+            if rnd.random() < strip_frac:
+                pending += 1
+            else:
+                row['translation_ps'] = words.get('ps', '')
+            out.append(row)
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+    return pending
+
+
+def parse_stats_line(output: str, prefix: str) -> Dict[str, str]:
+    """`key=value` pairs from the last output line starting with `prefix`."""
+    for line in reversed(output.splitlines()):
+        if line.startswith(prefix):
+            return dict(re.findall(r'(\w+)=([^,\s]+)', line[len(prefix):]))
+    return {}
+
+
+def run_once(*, script: str, work_dir: str, words_dir: str, server: MockChatServer, extra_args: List[str], timeout_sec: float) -> Tuple[int, float, str]:
+    env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='mock-key')
+    cmd = [sys.executable, os.path.join(HERE, SCRIPTS[script]), '--dir', words_dir, '--cache', '', *extra_args]
+    t0 = time.monotonic()
+    proc = subprocess.run(cmd, env=env, cwd=work_dir, capture_output=True, text=True, timeout=timeout_sec)
+    return proc.returncode, time.monotonic() - t0, proc.stdout + proc.stderr
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--script', choices=sorted(SCRIPTS), default='fr_tr')
+    ap.add_argument('--words-dir', default=DEFAULT_WORDS_DIR)
+    ap.add_argument('--files', type=int, default=0, help='Use only the first N level files (0 = all)')
+    ap.add_argument('--strip', type=float, default=1.0, help='Share of items whose target translations are removed')
+    ap.add_argument('--timeout', type=float, default=1800.0, help='Kill the script after this many seconds')
+    ap.add_argument('--json', action='store_true', help='Print the result as one JSON object')
+    ap.add_argument('--keep', action='store_true', help='Keep the temporary words directory')
+    add_config_args(ap)
+    args, extra = ap.parse_known_args()
+    if extra and extra[0] == '--':
+        extra = extra[1:]
+
+    rnd = random.Random(args.seed)
+    # The scripts keep caches and manifests in the working directory, next to
+    # (not inside) the words copy.
+    work_dir = tempfile.mkdtemp(prefix='bench-words-')
+    words_dir = os.path.join(work_dir, 'words')
+    os.makedirs(words_dir)
+    files = level_files(args.words_dir, args.files)
+    prepare = prepare_ps if args.script == 'ps' else prepare_fr_tr
+    pending = prepare(args.words_dir, words_dir, files, args.strip, rnd)
+
+    server = MockChatServer(config_from_args(args)).start()
+    try:
+        code, wall_sec, output = run_once(script=args.script, work_dir=work_dir, words_dir=words_dir, server=server, extra_args=extra, timeout_sec=args.timeout)
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    served = server.stats()
+    http = parse_stats_line(output, 'HTTP: ')
+    result: Dict[str, Any] = {
+        'script': SCRIPTS[args.script],
+        'exit_code': code,
+        'files': len(files),
+        'pending_items': pending,
+        'wall_sec': round(wall_sec, 2),
+        'items_per_sec': round(pending / wall_sec, 1) if wall_sec > 0 else 0.0,
+        'requests': served['requests'],
+        'client_retries': int(http.get('retries', 0)),
+        'connections': served['connections'],
+        'rows_returned': served['rows'],
+        'errors_500': served['errors_500'],
+        'rate_limited_429': served['rate_limited_429'],
+        'malformed': served['malformed'],
+        'dropped_rows': served['dropped_rows'],
+        'disconnects': served['disconnects'],
+    }
+    if args.keep:
+        result['words_dir'] = words_dir
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for k, v in result.items():
+            print(f'{k}: {v}')
+    if code != 0:
+        print(output[-2000:], file=sys.stderr)
+        sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+_ALL_CAPS_RE = re.compile(r"[A-ZÄÖÜ]{2,}")
+
+
+class DoNotTranslate:
+    """
+    do_not_translate.json compiled once: exact words in a set, prefixes in a
+    character trie and all regexes without groups in one alternation, so a
+    lookup costs O(len(word)) no matter how long the lists get. Regexes with
+    groups are kept on their own so back-references keep their numbers.
+    Invalid regexes are left out and listed in `errors`.
+    """
+
+    _END = ""
+
+    def __init__(self, exact: List[str], prefix: List[str], regex: List[str]):
+        self.exact = {str(w) for w in exact}
+        self.trie: Dict[str, Any] = {}
+        for p in prefix:
+            node = self.trie
+            for ch in str(p):
+                node = node.setdefault(ch, {})
+            node[self._END] = True
+
+        self.errors: List[str] = []
+        self.patterns: List[re.Pattern] = []
+        plain: List[str] = []
+        for rgx in regex:
+            try:
+                compiled = re.compile(str(rgx))
+            except re.error as e:
+                self.errors.append(f"{rgx!r}: {e}")
+                continue
+            if compiled.groups:
+                # Combining would renumber the groups its back-references use.
+                self.patterns.append(compiled)
+            else:
+                plain.append(str(rgx))
+        if plain:
+            try:
+                self.patterns.insert(0, re.compile("|".join(f"(?:{rgx})" for rgx in plain)))
+            except re.error:
+                # Inline flags that only work at the start of a pattern.
+                self.patterns[:0] = [re.compile(rgx) for rgx in plain]
+
+    def has_prefix(self, word: str) -> bool:
+        node = self.trie
+        if self._END in node:
+            return True
+        for ch in word:
+            node = node.get(ch)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+    def matches(self, word: str) -> bool:
+        if word in self.exact or self.has_prefix(word):
+            return True
+        return any(p.search(word) for p in self.patterns)
+
+
+def load_do_not_translate(path: Optional[str]) -> DoNotTranslate:
+    if not path or not os.path.exists(path):
+        return DoNotTranslate([], [], [])
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    return DoNotTranslate(cfg.get("exact", []), cfg.get("prefix", []), cfg.get("regex", []))
+
+
+def is_non_translatable(word: str, item: Dict[str, Any], dnt: Optional[DoNotTranslate] = None, *, heuristics: bool = True) -> bool:
+    """
+    True for words that are copied verbatim instead of translated: flagged
+    `dont_translate`, listed in `dnt`, or (with `heuristics`) with digits, an
+    email/URL or all caps.
+    """
+    if item.get("dont_translate") is True:
+        return True
+
+    w = (word or "").strip()
+    if not w:
+        return True
+
+    if dnt is not None and dnt.matches(w):
+        return True
+
+    if not heuristics:
+        return False
+    if any(ch.isdigit() for ch in w):
+        return True
+    if "@" in w or w.startswith("http"):
+        return True
+    if _ALL_CAPS_RE.fullmatch(w):
+        return True
+
+    return False
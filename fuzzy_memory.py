@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from translation_memory import Source, TranslationMemory, fold_source
+
+# Reuse changes output (folding drops `fa` and punctuation), so it is opt-in.
+DEFAULT_REUSE_SCORE = 0.0
+DEFAULT_MAX_HINTS = 2
+
+fuzzy_text = fold_source
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    padded = f' {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class FuzzyIndex:
+    """
+    Character-trigram index over sources with known translations.
+
+    Similarity is the Dice coefficient of the trigram sets of the folded
+    German + English text, so 1.0 means the sources only differ in case,
+    punctuation or spacing ("Medien )Pl.(" vs "Medien (Pl.)"). A match at or
+    above `reuse_score` is taken as the translation outright; matches at or
+    above `hint_score` are returned as reference rows for the prompt. Either
+    is disabled by a score of 0.
+
+    A `memory` is not loaded into the index. It only serves same-folded-text
+    reuse through its indexed `folded` column, after the in-process entries.
+    """
+
+    def __init__(self, *, reuse_score: float = DEFAULT_REUSE_SCORE, hint_score: float = 0.0, max_hints: int = DEFAULT_MAX_HINTS, memory: Optional[TranslationMemory] = None):
+        self.reuse_score = reuse_score
+        self.hint_score = hint_score
+        self.max_hints = max_hints
+        self.memory = memory
+        self._ids: Dict[str, int] = {}
+        self._sources: List[Source] = []
+        self._grams: List[FrozenSet[str]] = []
+        self._translations: List[Dict[str, str]] = []
+        self._postings: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    @property
+    def enabled(self) -> bool:
+        return self.reuse_score > 0 or self.hint_score > 0
+
+    def add(self, source: Source, translations: Dict[str, str]):
+        translations = {lang: text for lang, text in translations.items() if text}
+        if not translations:
+            return
+        text = fuzzy_text(source)
+        if not text.replace('|', '').strip():
+            return
+        i = self._ids.get(text)
+        if i is not None:
+            # The first translation seen for a source wins, as in the cache.
+            for lang, t in translations.items():
+                self._translations[i].setdefault(lang, t)
+            return
+        i = len(self._sources)
+        self._ids[text] = i
+        grams = trigrams(text)
+        self._sources.append(source)
+        self._grams.append(grams)
+        self._translations.append(dict(translations))
+        for g in grams:
+            self._postings.setdefault(g, []).append(i)
+
+    def matches(self, source: Source, langs: Sequence[str], min_score: float) -> List[Tuple[float, int]]:
+        """(score, entry) for entries with any of `langs` scoring at least `min_score`, best first."""
+        grams = trigrams(fuzzy_text(source))
+        shared: Counter = Counter()
+        for g in grams:
+            shared.update(self._postings.get(g, ()))
+        out = []
+        for i, n in shared.items():
+            score = 2.0 * n / (len(grams) + len(self._grams[i]))
+            if score >= min_score and any(lang in self._translations[i] for lang in langs):
+                out.append((score, i))
+        out.sort(key=lambda m: (-m[0], m[1]))
+        return out
+
+    def reuse(self, source: Source, langs: Sequence[str]) -> Dict[str, str]:
+        """Translations for `langs` taken from the best near-identical source, if any."""
+        if self.reuse_score <= 0:
+            return {}
+        if self.reuse_score >= 1.0:
+            # Only the same folded text qualifies, which is a plain lookup.
+            i = self._ids.get(fuzzy_text(source))
+            candidates = [i] if i is not None else []
+        else:
+            candidates = [i for _, i in self.matches(source, langs, self.reuse_score)]
+        out: Dict[str, str] = {}
+        for i in candidates:
+            for lang in langs:
+                if lang not in out and self._translations[i].get(lang):
+                    out[lang] = self._translations[i][lang]
+            if len(out) == len(langs):
+                break
+        if self.memory is not None and len(out) < len(langs):
+            found = self.memory.get_folded(fuzzy_text(source), [lang for lang in langs if lang not in out])
+            out.update(found)
+        return out
+
+    def hints(self, source: Source, langs: Sequence[str]) -> List[Dict[str, str]]:
+        """Up to `max_hints` similar rows ({de, en, <langs they have>}) to show the model."""
+        if self.hint_score <= 0 or self.max_hints <= 0 or not self._sources:
+            return []
+        out = []
+        for _, i in self.matches(source, langs, self.hint_score):
+            hint = {'de': self._sources[i][0], 'en': self._sources[i][1]}
+            hint.update({lang: self._translations[i][lang] for lang in langs if lang in self._translations[i]})
+            out.append(hint)
+            if len(out) >= self.max_hints:
+                break
+        return out
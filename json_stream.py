@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import re
+import sys
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+# An object that starts an array element: `[` or `,`, then `{"`.
+_ELEMENT_START_RE = re.compile(r'[\[,]\s*(\{\s*")')
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+# Flat `"field": "value"` pairs, where a value runs to the quote that is
+# followed by the next field or the closing brace, so stray quotes inside it survive.
+_LOOSE_PAIR_RE = re.compile(r'"(\w+)"\s*:\s*(?:"(.*?)"|(-?\d+(?:\.\d+)?|true|false|null))\s*(?=,\s*"\w+"\s*:|\s*,?\s*\}\s*$)', re.S)
+# A field name inside a loosely parsed value: the value ran on into a
+# neighbouring field that lost its comma or quote.
+_EMBEDDED_FIELD_RE = re.compile(r'"\w+"\s*:')
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array that arrives in pieces, such as a
+    streamed completion. `feed()` returns the top-level elements that closed
+    in the new text, so a caller can use each row as soon as it is complete.
+
+    Text before the opening `[` (e.g. a markdown fence) is skipped. An
+    element that does not parse is dropped and counted in `errors`.
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._started = False
+        self._closed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._elem_start = -1
+        self.elements = 0
+        self.errors = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def feed(self, text: str) -> List[Any]:
+        out: List[Any] = []
+        if self._closed or not text:
+            return out
+        self._buf += text
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+
+        if not self._started:
+            j = buf.find('[', i)
+            if j == -1:
+                self._pos = n
+                return out
+            self._started = True
+            i = j + 1
+
+        while i < n:
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 0 and self._elem_start == -1:
+                    self._elem_start = i
+            elif ch in '{[':
+                if self._depth == 0:
+                    self._elem_start = i
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    # The closing bracket of the array itself.
+                    self._finish_scalar(buf, i, out)
+                    self._closed = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._elem_start:i + 1], out)
+                    self._elem_start = -1
+            elif self._depth == 0:
+                if ch == ',':
+                    self._finish_scalar(buf, i, out)
+                elif not ch.isspace() and self._elem_start == -1:
+                    self._elem_start = i
+            i += 1
+
+        # Drop consumed text so the buffer only holds the open element.
+        keep = self._elem_start if self._elem_start != -1 else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._elem_start != -1:
+            self._elem_start = 0
+        return out
+
+    def _finish_scalar(self, buf: str, end: int, out: List[Any]):
+        if self._elem_start != -1:
+            self._emit(buf[self._elem_start:end].strip(), out)
+            self._elem_start = -1
+
+    def _emit(self, text: str, out: List[Any]):
+        if not text:
+            return
+        try:
+            out.append(json.loads(text))
+            self.elements += 1
+        except ValueError:
+            self.errors += 1
+
+
+def _repair_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse one damaged `{...}` element: as is, without trailing commas, then field by field."""
+    for candidate in (text, _TRAILING_COMMA_RE.sub(r'\1', text)):
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        return value if isinstance(value, dict) else None
+    pairs = _LOOSE_PAIR_RE.findall(text)
+    if not pairs:
+        return None
+    out: Dict[str, Any] = {}
+    for field, string, literal in pairs:
+        if literal:
+            out[field] = json.loads(literal)
+            continue
+        if _EMBEDDED_FIELD_RE.search(string):
+            # Guessing where the fields split would store garbage for good;
+            # dropping the row gets its key resent instead.
+            return None
+        try:
+            out[field] = json.loads(f'"{string}"')
+        except ValueError:
+            out[field] = string.replace('\\"', '"')
+    return out
+
+
+def salvage_json_array(text: str) -> Tuple[List[Any], bool]:
+    """
+    Elements of the JSON array in a model response, recovering every object
+    it can from a damaged one (trailing commas, unescaped quotes, a truncated
+    tail). A truncated or unreadable element is dropped rather than guessed,
+    so callers find its key missing and resend only that row.
+
+    Returns (elements, clean) where `clean` is False when repairs were
+    needed. Raises ValueError when no array (or no object in it) is found.
+    """
+    s = (text or '').strip()
+    i = s.find('[')
+    j = s.rfind(']')
+    if i != -1 and j > i:
+        try:
+            value = json.loads(s[i:j + 1])
+        except ValueError:
+            pass
+        else:
+            if isinstance(value, list):
+                return value, True
+    if i == -1:
+        raise ValueError('No JSON array found in model response')
+
+    starts = [m.start(1) for m in _ELEMENT_START_RE.finditer(s, i)]
+    elements: List[Any] = []
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(s)
+        fragment = s[start:end]
+        close = fragment.rfind('}')
+        value = _repair_object(fragment[:close + 1]) if close != -1 else None
+        if value is not None:
+            elements.append(value)
+    if not elements:
+        raise ValueError('No JSON object could be recovered from model response')
+    return elements, False
+
+
+def report_lost(keys: List[str], sent: int, out: TextIO = sys.stderr):
+    """Name the rows a malformed response lost (by item id, the first part of each key); only those are resent."""
+    ids = [key.split('|', 1)[0] for key in keys]
+    shown = ', '.join(ids[:8]) + (f' (+{len(ids) - 8} more)' if len(ids) > 8 else '')
+    print(f'Malformed response: recovered {sent - len(keys)}/{sent} rows' + (f', lost {shown}' if ids else ''), file=out)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for exercising the
+translation scripts offline:
+
+    python3 mock_openai_server.py --port 8765 --latency-ms 400 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock \\
+        python3 translate_words_fr_tr.py --dir /tmp/words-copy
+
+Batch prompts get one row per input key, with every requested output field
+(or the row's `need` list) set to `<lang>:<de>`. Plain-text prompts get `<lang>:<German line>`.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from batching import estimate_tokens
+
+
+class MockConfig:
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        latency_dist: str = 'fixed',
+        latency_sigma: float = 0.5,
+        ms_per_row: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_sec: float = 1.0,
+        rpm: int = 0,
+        malformed_rate: float = 0.0,
+        drop_row_rate: float = 0.0,
+        disconnect_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.ms_per_row = ms_per_row
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_sec = retry_after_sec
+        self.rpm = rpm
+        self.malformed_rate = malformed_rate
+        self.drop_row_rate = drop_row_rate
+        self.disconnect_rate = disconnect_rate
+        self.seed = seed
+
+
+def output_fields(system_prompt: str) -> List[str]:
+    """Fields of the last `{key,...}` shape in the prompt, i.e. the requested output."""
+    shapes = re.findall(r'\{key,([a-z_,]+)\}', system_prompt)
+    if not shapes:
+        return []
+    return [f for f in shapes[-1].split(',') if f]
+
+
+def corrupt_json(text: str, rnd: random.Random) -> str:
+    mode = rnd.choice(['trailing_comma', 'truncate', 'unescaped_quote'])
+    if mode == 'trailing_comma' and text.endswith(']'):
+        return text[:-1] + ',]'
+    if mode == 'truncate':
+        return text[:max(1, int(len(text) * rnd.uniform(0.5, 0.95)))]
+    i = text.find('":"', len(text) // 2)
+    if i == -1:
+        return text[:-1]
+    return text[:i + 3] + 'he said "hi"' + text[i + 3:]
+
+
+class MockChatServer:
+    """Threaded HTTP/1.1 keep-alive server; `stats()` reports what it served."""
+
+    def __init__(self, config: MockConfig, host: str = '127.0.0.1', port: int = 0):
+        self.config = config
+        self.rnd = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._recent: deque = deque()
+        self.counters: Dict[str, int] = {
+            'requests': 0,
+            'ok': 0,
+            'rows': 0,
+            'errors_500': 0,
+            'rate_limited_429': 0,
+            'malformed': 0,
+            'dropped_rows': 0,
+            'disconnects': 0,
+            'streams': 0,
+            'connections': 0,
+        }
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockChatServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _roll(self, p: float) -> bool:
+        if p <= 0:
+            return False
+        with self._lock:
+            return self.rnd.random() < p
+
+    def _latency_sec(self, rows: int) -> float:
+        c = self.config
+        with self._lock:
+            if c.latency_dist == 'uniform':
+                base = self.rnd.uniform(0, 2 * c.latency_ms)
+            elif c.latency_dist == 'lognormal' and c.latency_ms > 0:
+                base = self.rnd.lognormvariate(math.log(c.latency_ms), c.latency_sigma)
+            else:
+                base = c.latency_ms
+        return (base + c.ms_per_row * rows) / 1000.0
+
+    def _quota_exceeded(self) -> Tuple[bool, int]:
+        if not self.config.rpm:
+            return False, 0
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.config.rpm:
+                return True, 0
+            self._recent.append(now)
+            return False, self.config.rpm - len(self._recent)
+
+    def complete(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], Any, float]:
+        """Return (status, headers, response body, latency seconds) for one chat-completions request."""
+        self._count('requests')
+        messages = body.get('messages') or []
+        system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+        user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+
+        exceeded, remaining = self._quota_exceeded()
+        if exceeded or self._roll(self.config.rate_limit_rate):
+            self._count('rate_limited_429')
+            retry = self.config.retry_after_sec
+            return 429, {'Retry-After': f'{retry:g}', 'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': f'{retry:g}s'}, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, 0.0
+        if self._roll(self.config.error_rate):
+            self._count('errors_500')
+            return 500, {}, {'error': {'message': 'Injected server error'}}, 0.0
+
+        try:
+            rows = json.loads(user)
+        except ValueError:
+            rows = None
+
+        if isinstance(rows, list):
+            fields = output_fields(system)
+            out = []
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                if self._roll(self.config.drop_row_rate):
+                    self._count('dropped_rows')
+                    continue
+                de = str(row.get('de', ''))
+                need = row.get('need') if isinstance(row.get('need'), list) else fields
+                out.append({'key': row.get('key', ''), **{f: f'{f}:{de}' for f in need}})
+            self._count('rows', len(out))
+            content = json.dumps(out, ensure_ascii=False, separators=(',', ':'))
+            n_rows = len(rows)
+        else:
+            first = user.split('\n', 1)[0]
+            de = first.split(':', 1)[1].strip() if ':' in first else first
+            content = f'ps:{de}'
+            self._count('rows')
+            n_rows = 1
+
+        if self._roll(self.config.malformed_rate):
+            self._count('malformed')
+            content = corrupt_json(content, self.rnd)
+
+        self._count('ok')
+        headers = {}
+        if self.config.rpm:
+            headers = {'x-ratelimit-limit-requests': str(self.config.rpm), 'x-ratelimit-remaining-requests': str(remaining)}
+        prompt_tokens = estimate_tokens(json.dumps(messages, ensure_ascii=False))
+        return 200, headers, {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': estimate_tokens(content),
+                'total_tokens': prompt_tokens + estimate_tokens(content),
+            },
+        }, self._latency_sec(n_rows)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                server._count('connections')
+
+            def _send(self, status: int, headers: Dict[str, str], body: Any, delay_sec: float = 0.0):
+                time.sleep(delay_sec)
+                raw = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self._send(200, {}, server.stats())
+                else:
+                    self._send(404, {}, {'error': {'message': 'not found'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length).decode('utf-8'))
+                except ValueError:
+                    self._send(400, {}, {'error': {'message': 'invalid JSON body'}})
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {}, {'error': {'message': 'not found'}})
+                    return
+                status, headers, resp, delay_sec = server.complete(body)
+                if body.get('stream') and status == 200:
+                    include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+                    self._stream(headers, resp, delay_sec, include_usage)
+                else:
+                    self._send(status, headers, resp, delay_sec)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+                self.wfile.flush()
+
+            def _stream(self, headers: Dict[str, str], resp: Dict[str, Any], delay_sec: float, include_usage: bool = False):
+                """Send the completion as server-sent events, spreading the latency over ~20 deltas."""
+                server._count('streams')
+                content = resp['choices'][0]['message']['content']
+                step = max(1, len(content) // 20)
+                pieces = [content[i:i + step] for i in range(0, len(content), step)] or ['']
+                cut = len(pieces)
+                if server._roll(server.config.disconnect_rate):
+                    server._count('disconnects')
+                    with server._lock:
+                        cut = server.rnd.randint(1, len(pieces))
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    if i == cut:
+                        # Drop the connection mid-stream, without the terminating chunk.
+                        self.close_connection = True
+                        return
+                    time.sleep(delay_sec / len(pieces))
+                    event = {'id': resp['id'], 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                    self._chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+                if include_usage:
+                    event = {'id': resp['id'], 'object': 'chat.completion.chunk', 'choices': [], 'usage': resp['usage']}
+                    self._chunk(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                self._chunk(b'data: [DONE]\n\n')
+                self._chunk(b'')
+
+        return Handler
+
+
+def add_config_args(ap: argparse.ArgumentParser):
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='Median response latency')
+    ap.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default='fixed')
+    ap.add_argument('--latency-sigma', type=float, default=0.5, help='Spread of the lognormal latency')
+    ap.add_argument('--ms-per-row', type=float, default=0.0, help='Extra latency per batch row')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with HTTP 500')
+    ap.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered with HTTP 429')
+    ap.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    ap.add_argument('--server-rpm', type=int, default=0, help='Enforce a requests/min quota (0 = none)')
+    ap.add_argument('--malformed-rate', type=float, default=0.0, help='Share of responses with broken JSON')
+    ap.add_argument('--drop-row-rate', type=float, default=0.0, help='Share of batch rows silently left out')
+    ap.add_argument('--disconnect-rate', type=float, default=0.0, help='Share of streamed responses cut off midway')
+    ap.add_argument('--seed', type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        ms_per_row=args.ms_per_row,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_sec=args.retry_after,
+        rpm=args.server_rpm,
+        malformed_rate=args.malformed_rate,
+        drop_row_rate=args.drop_row_rate,
+        disconnect_rate=args.disconnect_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    add_config_args(ap)
+    args = ap.parse_args()
+
+    server = MockChatServer(config_from_args(args), host=args.host, port=args.port)
+    print(f'Mock chat-completions server on {server.base_url} (stats at /stats)')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from batching import estimate_tokens
+from run_metrics import RunMetrics
+
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
+DEFAULT_API_URL = DEFAULT_API_BASE + '/chat/completions'
+MAX_BACKOFF_SEC = 60.0
+
+# Errors that mean a pooled keep-alive connection was closed by the server
+# while idle; the request is replayed once on a fresh connection.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class ChatHTTPError(RuntimeError):
+    def __init__(self, status: int, body: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f'HTTP {status}: {body[:200]}')
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse Retry-After seconds or x-ratelimit-reset values such as `1s`, `6m0s`, `20ms`."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def retry_after_sec(headers: Dict[str, str]) -> Optional[float]:
+    if 'retry-after-ms' in headers:
+        ms = parse_duration(headers['retry-after-ms'])
+        if ms is not None:
+            return ms / 1000.0
+    return parse_duration(headers.get('retry-after', ''))
+
+
+def resolve_api_url() -> str:
+    """Chat-completions URL, honoring OPENAI_BASE_URL (e.g. a local mock server)."""
+    base = os.environ.get('OPENAI_BASE_URL', '').strip().rstrip('/')
+    return (base or DEFAULT_API_BASE) + '/chat/completions'
+
+
+class RateLimiter:
+    """
+    Token-bucket scheduler for requests/min and tokens/min quotas.
+
+    `acquire()` blocks until a request of the given estimated size fits both
+    buckets. `observe()` folds the server's x-ratelimit-* headers into the
+    buckets, and `pause()` holds every caller back after a 429 / Retry-After.
+    A limit of 0 disables that bucket; server hints are honored either way.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.rpm = max(0.0, float(rpm))
+        self.tpm = max(0.0, float(tpm))
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.wait_sec = 0.0
+        self.pauses = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int = 0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+                # A request larger than the whole bucket only waits for a full one.
+                need = min(tokens, self.tpm)
+                if self.tpm and self._tokens < need:
+                    wait = max(wait, (need - self._tokens) * 60.0 / self.tpm)
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= need
+                    return
+                self.wait_sec += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.pauses += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+
+    def observe(self, headers: Dict[str, str]):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for kind in ('requests', 'tokens'):
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                if remaining is None:
+                    continue
+                try:
+                    remaining_n = float(remaining)
+                except ValueError:
+                    continue
+                if kind == 'requests' and self.rpm:
+                    self._requests = min(self._requests, remaining_n)
+                if kind == 'tokens' and self.tpm:
+                    self._tokens = min(self._tokens, remaining_n)
+                if remaining_n <= 0:
+                    reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}', ''))
+                    if reset:
+                        self._paused_until = max(self._paused_until, now + reset)
+
+
+class ChatSession:
+    """
+    Keep-alive HTTP session shared by every chat-completions call in a run.
+
+    At most `pool_size` connections are open at once; idle ones are reused by
+    the next request. With `http2=True` the requests go through httpx (needs
+    `pip install httpx[http2]`) and are multiplexed over one connection.
+    Every attempt made through `chat_completion*` is recorded in `metrics`.
+    """
+
+    def __init__(self, *, url: Optional[str] = None, pool_size: int = 1, http2: bool = False, limiter: Optional[RateLimiter] = None, metrics: Optional[RunMetrics] = None):
+        url = url or resolve_api_url()
+        parts = urlsplit(url)
+        self.url = url
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname or ''
+        self.port = parts.port
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.pool_size = max(1, pool_size)
+        self.http2 = http2
+        self.limiter = limiter or RateLimiter()
+        self.metrics = metrics or RunMetrics()
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._served: Dict[int, int] = {}
+        self._httpx = None
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.reused = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+        if http2:
+            try:
+                import httpx
+            except ImportError as e:
+                raise RuntimeError('HTTP/2 requires httpx: pip install "httpx[http2]"') from e
+            self._httpx = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+
+    def __enter__(self) -> 'ChatSession':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _new_connection(self, timeout_sec: float) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        self._count(connections_opened=1)
+        return cls(self.host, self.port, timeout=timeout_sec)
+
+    def _checkout(self, timeout_sec: float) -> http.client.HTTPConnection:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._new_connection(timeout_sec)
+        conn.timeout = timeout_sec
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout_sec)
+        return conn
+
+    def _checkin(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            with self._lock:
+                self._idle.append(conn)
+        else:
+            self._discard(conn)
+
+    def _discard(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._served.pop(id(conn), None)
+        conn.close()
+
+    def post_json(self, *, payload: Dict[str, Any], headers: Dict[str, str], timeout_sec: float) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        body = json.dumps(payload).encode('utf-8')
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+        self._count(requests=1)
+        if self._httpx is not None:
+            return self._post_httpx(body, headers, timeout_sec)
+
+        with self._slots:
+            for attempt in range(2):
+                conn = self._checkout(timeout_sec)
+                with self._lock:
+                    served = self._served.get(id(conn), 0)
+                try:
+                    conn.request('POST', self.path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    raw = resp.read()
+                except _STALE_CONNECTION_ERRORS:
+                    self._discard(conn)
+                    if served and attempt == 0:
+                        continue
+                    raise
+                except Exception:
+                    self._discard(conn)
+                    raise
+
+                if served:
+                    self._count(reused=1)
+                with self._lock:
+                    self._served[id(conn)] = served + 1
+                self._checkin(conn, reusable=not resp.will_close)
+
+                text = raw.decode('utf-8', errors='replace')
+                resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+                if resp.status >= 300:
+                    raise ChatHTTPError(resp.status, text, resp_headers)
+                return json.loads(text), resp_headers
+        raise AssertionError('unreachable')
+
+    def post_stream(self, *, payload: Dict[str, Any], headers: Dict[str, str], timeout_sec: float, resp_headers: Optional[Dict[str, str]] = None, usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        POST with `stream: true` and yield the content deltas of the
+        server-sent events as they arrive. `timeout_sec` bounds each read, so
+        a stalled stream raises instead of hanging. Response headers are
+        copied into `resp_headers` once the status line is in, and the final
+        token usage into `usage`.
+        """
+        body = json.dumps(dict(payload, stream=True, stream_options={'include_usage': True})).encode('utf-8')
+        headers = dict(headers, **{'Content-Type': 'application/json', 'Accept': 'text/event-stream'})
+        self._count(requests=1)
+        if self._httpx is not None:
+            yield from self._stream_httpx(body, headers, timeout_sec, resp_headers, usage)
+            return
+
+        with self._slots:
+            for attempt in range(2):
+                conn = self._checkout(timeout_sec)
+                with self._lock:
+                    served = self._served.get(id(conn), 0)
+                try:
+                    conn.request('POST', self.path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                except _STALE_CONNECTION_ERRORS:
+                    self._discard(conn)
+                    if served and attempt == 0:
+                        continue
+                    raise
+                except Exception:
+                    self._discard(conn)
+                    raise
+                break
+
+            if served:
+                self._count(reused=1)
+            got_headers = {k.lower(): v for k, v in resp.getheaders()}
+            if resp_headers is not None:
+                resp_headers.update(got_headers)
+            done = False
+            try:
+                if resp.status >= 300:
+                    text = resp.read().decode('utf-8', errors='replace')
+                    done = True
+                    raise ChatHTTPError(resp.status, text, got_headers)
+                for raw in resp:
+                    delta = _sse_delta(raw, usage)
+                    if delta is None:
+                        break
+                    if delta:
+                        yield delta
+                resp.read()
+                done = True
+            finally:
+                # A stream abandoned midway leaves unread data on the socket.
+                if done:
+                    with self._lock:
+                        self._served[id(conn)] = served + 1
+                    self._checkin(conn, reusable=not resp.will_close)
+                else:
+                    self._discard(conn)
+
+    def _stream_httpx(self, body: bytes, headers: Dict[str, str], timeout_sec: float, resp_headers: Optional[Dict[str, str]], usage: Optional[Dict[str, Any]]) -> Iterator[str]:
+        opened = []
+
+        def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == 'connection.connect_tcp.complete':
+                opened.append(1)
+
+        with self._httpx.stream('POST', self.url, content=body, headers=headers, timeout=timeout_sec, extensions={'trace': trace}) as resp:
+            if opened:
+                self._count(connections_opened=len(opened))
+            else:
+                self._count(reused=1)
+            got_headers = {k.lower(): v for k, v in resp.headers.items()}
+            if resp_headers is not None:
+                resp_headers.update(got_headers)
+            if resp.status_code >= 300:
+                resp.read()
+                raise ChatHTTPError(resp.status_code, resp.text, got_headers)
+            for line in resp.iter_lines():
+                delta = _sse_delta(line, usage)
+                if delta is None:
+                    break
+                if delta:
+                    yield delta
+
+    def _post_httpx(self, body: bytes, headers: Dict[str, str], timeout_sec: float) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        opened = []
+
+        def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == 'connection.connect_tcp.complete':
+                opened.append(1)
+
+        resp = self._httpx.post(self.url, content=body, headers=headers, timeout=timeout_sec, extensions={'trace': trace})
+        if opened:
+            self._count(connections_opened=len(opened))
+        else:
+            self._count(reused=1)
+        resp_headers = {k.lower(): v for k, v in resp.headers.items()}
+        if resp.status_code >= 300:
+            raise ChatHTTPError(resp.status_code, resp.text, resp_headers)
+        return resp.json(), resp_headers
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._served.clear()
+        for conn in idle:
+            conn.close()
+        if self._httpx is not None:
+            self._httpx.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            reuse_ratio = (self.reused / self.requests) if self.requests else 0.0
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'reused': self.reused,
+                'reuse_ratio': round(reuse_ratio, 3),
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'throttle_wait_sec': round(self.limiter.wait_sec, 1),
+                'http2': self.http2,
+            }
+
+    def format_stats(self) -> str:
+        return 'HTTP: ' + ', '.join(f'{k}={v}' for k, v in self.stats().items())
+
+
+def _sse_delta(raw: Any, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Content delta of one server-sent-event line; '' for other lines, None at
+    `[DONE]`. A `usage` object in the event is copied into `usage`.
+    """
+    line = raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else raw
+    line = line.strip()
+    if not line.startswith('data:'):
+        return ''
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return None
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return ''
+    if not isinstance(event, dict):
+        return ''
+    if usage is not None and isinstance(event.get('usage'), dict):
+        usage.update(event['usage'])
+    try:
+        return (event['choices'][0].get('delta') or {}).get('content') or ''
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ''
+
+
+def chat_completion(
+    session: ChatSession,
+    *,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    timeout_sec: float,
+    retries: int,
+    retry_backoff_sec: float,
+) -> str:
+    payload = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    headers = {'Authorization': f'Bearer {api_key}'}
+
+    def send() -> str:
+        res, resp_headers = session.post_json(payload=payload, headers=headers, timeout_sec=timeout_sec)
+        session.limiter.observe(resp_headers)
+        session.metrics.observe_usage(res.get('usage'))
+        return res['choices'][0]['message']['content']
+
+    return _with_retries(session, send, tokens=_request_tokens(messages), retries=retries, retry_backoff_sec=retry_backoff_sec)
+
+
+def chat_completion_stream(
+    session: ChatSession,
+    *,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    timeout_sec: float,
+    retries: int,
+    retry_backoff_sec: float,
+    on_text: Callable[[str], None],
+) -> str:
+    """
+    Streaming variant of `chat_completion`: `on_text` sees every content
+    delta as it arrives, and the full text is returned at the end. A failure
+    before any text arrived is retried as usual; once text has been handed
+    to `on_text` the error is raised so the caller keeps what it has.
+    """
+    payload = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    headers = {'Authorization': f'Bearer {api_key}'}
+    received: List[str] = []
+
+    def send() -> str:
+        resp_headers: Dict[str, str] = {}
+        usage: Dict[str, Any] = {}
+        try:
+            for delta in session.post_stream(payload=payload, headers=headers, timeout_sec=timeout_sec, resp_headers=resp_headers, usage=usage):
+                received.append(delta)
+                on_text(delta)
+        finally:
+            session.limiter.observe(resp_headers)
+            session.metrics.observe_usage(usage)
+        return ''.join(received)
+
+    return _with_retries(session, send, tokens=_request_tokens(messages), retries=retries, retry_backoff_sec=retry_backoff_sec, can_retry=lambda: not received)
+
+
+def _request_tokens(messages: List[Dict[str, str]]) -> int:
+    # Prompt estimate plus roughly as much again for the completion.
+    return 2 * estimate_tokens(json.dumps(messages, ensure_ascii=False))
+
+
+def _with_retries(session: ChatSession, send: Callable[[], str], *, tokens: int, retries: int, retry_backoff_sec: float, can_retry: Callable[[], bool] = lambda: True) -> str:
+    attempt = 0
+    while True:
+        session.limiter.acquire(tokens)
+        started = time.monotonic()
+        try:
+            result = send()
+            session.metrics.observe_request(time.monotonic() - started, 'ok')
+            return result
+        except ChatHTTPError as e:
+            session.metrics.observe_request(time.monotonic() - started, f'http_{e.status}')
+            session.limiter.observe(e.headers)
+            retryable = e.status == 429 or e.status >= 500
+            attempt += 1
+            if not retryable or attempt > retries or not can_retry():
+                raise
+            session._count(retries=1)
+            session.metrics.count(retries=1)
+            wait = retry_after_sec(e.headers)
+            if wait is None:
+                wait = _backoff(retry_backoff_sec, attempt)
+            if e.status == 429:
+                # Hold back every worker, not just this one; acquire() waits it out.
+                session._count(rate_limited=1)
+                session.limiter.pause(wait)
+            else:
+                time.sleep(wait)
+        except Exception as e:
+            timed_out = isinstance(e, (socket.timeout, TimeoutError)) or type(e).__name__.endswith('Timeout')
+            session.metrics.observe_request(time.monotonic() - started, 'timeout' if timed_out else 'error')
+            attempt += 1
+            if attempt > retries or not can_retry():
+                raise
+            session._count(retries=1)
+            session.metrics.count(retries=1)
+            time.sleep(_backoff(retry_backoff_sec, attempt))
+
+
+def _backoff(base_sec: float, attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(MAX_BACKOFF_SEC, base_sec * (2 ** (attempt - 1))))
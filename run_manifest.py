@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class RunManifest:
+    """
+    Persistent per-file state for one translation script.
+
+    Each level file is recorded with its size, mtime and SHA-256 after the
+    script last wrote or checked it, plus whether it is fully enriched and,
+    for an interrupted pass, the item index to resume from. State only counts
+    while the file is unchanged: a matching size and mtime is trusted as is,
+    otherwise the content hash decides. Per-batch checkpoints only record the
+    size and mtime; the hash is taken when a file is finished or written.
+    """
+
+    def __init__(self, path: str, task: str, *, reset: bool = False):
+        self.path = path
+        self.task = task
+        self.skipped = 0
+        self.resumed = 0
+        self._data: Dict[str, Any] = {'version': MANIFEST_VERSION, 'tasks': {}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict) and loaded.get('version') == MANIFEST_VERSION:
+                    self._data = loaded
+            except (OSError, ValueError):
+                pass
+        if reset:
+            self._data['tasks'][task] = {}
+        self._files: Dict[str, Dict[str, Any]] = self._data['tasks'].setdefault(task, {})
+
+    def _entry(self, path: str) -> Optional[Dict[str, Any]]:
+        """The recorded entry for `path`, or None when the file changed since."""
+        entry = self._files.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size == entry.get('size') and st.st_mtime_ns == entry.get('mtime_ns'):
+            return entry
+        if st.st_size != entry.get('size') or not entry.get('sha256') or file_sha256(path) != entry.get('sha256'):
+            return None
+        # Same content under a new mtime (e.g. a fresh checkout): refresh the stat.
+        entry['mtime_ns'] = st.st_mtime_ns
+        return entry
+
+    def is_complete(self, path: str) -> bool:
+        entry = self._entry(path)
+        if entry is not None and entry.get('complete'):
+            self.skipped += 1
+            return True
+        return False
+
+    def cursor(self, path: str) -> int:
+        """Item index an interrupted pass over `path` stopped at (0 = from the start)."""
+        entry = self._entry(path)
+        start = int(entry.get('cursor', 0)) if entry is not None else 0
+        if start > 0:
+            self.resumed += 1
+        return start
+
+    def record(self, path: str, *, complete: bool, cursor: int = 0):
+        """Fingerprint `path` as it is on disk now and save the manifest."""
+        st = os.stat(path)
+        self._files[os.path.abspath(path)] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': file_sha256(path),
+            'complete': complete,
+            'cursor': 0 if complete else max(0, cursor),
+        }
+        self.save()
+
+    def checkpoint(self, path: str, *, cursor: int):
+        """
+        Record the resume cursor of a pass in progress. Only the file's size
+        and mtime are taken, so this stays cheap enough to call every batch;
+        the hash is kept when the file has not changed since it was taken.
+        """
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        previous = self._files.get(key) or {}
+        unchanged = previous.get('size') == st.st_size and previous.get('mtime_ns') == st.st_mtime_ns
+        self._files[key] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': previous.get('sha256') if unchanged else None,
+            'complete': False,
+            'cursor': max(0, cursor),
+        }
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp', dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2, sort_keys=True)
+                f.write('\n')
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def format_stats(self) -> str:
+        return f'Manifest: complete_files_skipped={self.skipped}, files_resumed={self.resumed}'
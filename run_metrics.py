@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+# Upper bounds (seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+PROM_PREFIX = 'wordmap_translate'
+DEFAULT_HISTORY_FILE = 'translate_history.jsonl'
+
+
+def _atomic_write(path: str, text: str):
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+
+class RunMetrics:
+    """
+    Per-request telemetry for one translation run.
+
+    Every chat-completions attempt is recorded with its latency and outcome
+    (`ok`, `http_<status>`, `timeout` or `error`) plus the token counts from
+    the response's `usage`. The scripts add retries, bisection fallback
+    calls, cache hits/misses and parse failures. Safe to share between
+    worker threads.
+    """
+
+    def __init__(self, script: str = ''):
+        self.script = script
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.outcomes: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'retries': 0,
+            'fallback_calls': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'parse_failures': 0,
+            'rows_sent': 0,
+            'rows_received': 0,
+        }
+        self._live: Optional[threading.Thread] = None
+        self._live_stop = threading.Event()
+
+    def observe_request(self, latency_sec: float, outcome: str = 'ok'):
+        with self._lock:
+            self._latencies.append(latency_sec)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency_sec <= bound:
+                    self._buckets[i] += 1
+                    break
+            else:
+                self._buckets[-1] += 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def observe_usage(self, usage: Optional[Dict[str, Any]]):
+        if not isinstance(usage, dict):
+            return
+        self.count(
+            prompt_tokens=int(usage.get('prompt_tokens') or 0),
+            completion_tokens=int(usage.get('completion_tokens') or 0),
+        )
+
+    def count(self, **deltas: int):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] = self.counters.get(name, 0) + delta
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self.counters)
+            outcomes = dict(self.outcomes)
+            buckets = list(self._buckets)
+        elapsed = time.monotonic() - self._t0
+        lookups = counters['cache_hits'] + counters['cache_misses']
+        cumulative = []
+        total = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), buckets):
+            total += n
+            cumulative.append(['+Inf' if bound == float('inf') else bound, total])
+        return {
+            'script': self.script,
+            'started_at': self.started,
+            'duration_sec': round(elapsed, 3),
+            'requests': len(latencies),
+            'outcomes': outcomes,
+            'latency_sec': {
+                'sum': round(sum(latencies), 3),
+                'p50': round(_percentile(latencies, 0.50), 3),
+                'p90': round(_percentile(latencies, 0.90), 3),
+                'p99': round(_percentile(latencies, 0.99), 3),
+                'max': round(latencies[-1], 3) if latencies else 0.0,
+                'buckets': cumulative,
+            },
+            'cache_hit_ratio': round(counters['cache_hits'] / lookups, 3) if lookups else 0.0,
+            **counters,
+        }
+
+    def format_stats(self) -> str:
+        s = self.summary()
+        lat = s['latency_sec']
+        return (
+            f"Metrics: requests={s['requests']}, p50={lat['p50']}s, p90={lat['p90']}s, max={lat['max']}s, "
+            f"prompt_tokens={s['prompt_tokens']}, completion_tokens={s['completion_tokens']}, retries={s['retries']}, "
+            f"fallback_calls={s['fallback_calls']}, parse_failures={s['parse_failures']}, cache_hit_ratio={s['cache_hit_ratio']}"
+        )
+
+    def write_json(self, path: str):
+        _atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=2) + '\n')
+
+    def prometheus_text(self) -> str:
+        s = self.summary()
+        label = f'script="{self.script}"'
+        lines = [
+            f'# HELP {PROM_PREFIX}_request_duration_seconds Chat-completions request latency.',
+            f'# TYPE {PROM_PREFIX}_request_duration_seconds histogram',
+        ]
+        for bound, n in s['latency_sec']['buckets']:
+            lines.append(f'{PROM_PREFIX}_request_duration_seconds_bucket{{{label},le="{bound}"}} {n}')
+        lines.append(f'{PROM_PREFIX}_request_duration_seconds_sum{{{label}}} {s["latency_sec"]["sum"]}')
+        lines.append(f'{PROM_PREFIX}_request_duration_seconds_count{{{label}}} {s["requests"]}')
+
+        lines += [
+            f'# HELP {PROM_PREFIX}_requests_total Chat-completions attempts by outcome.',
+            f'# TYPE {PROM_PREFIX}_requests_total counter',
+        ]
+        for outcome, n in sorted(s['outcomes'].items()):
+            lines.append(f'{PROM_PREFIX}_requests_total{{{label},outcome="{outcome}"}} {n}')
+
+        lines += [
+            f'# HELP {PROM_PREFIX}_tokens_total Tokens reported in response usage.',
+            f'# TYPE {PROM_PREFIX}_tokens_total counter',
+            f'{PROM_PREFIX}_tokens_total{{{label},kind="prompt"}} {s["prompt_tokens"]}',
+            f'{PROM_PREFIX}_tokens_total{{{label},kind="completion"}} {s["completion_tokens"]}',
+        ]
+        for name in ('retries', 'fallback_calls', 'cache_hits', 'cache_misses', 'parse_failures', 'rows_sent', 'rows_received'):
+            lines += [
+                f'# TYPE {PROM_PREFIX}_{name}_total counter',
+                f'{PROM_PREFIX}_{name}_total{{{label}}} {s[name]}',
+            ]
+        lines += [
+            f'# TYPE {PROM_PREFIX}_cache_hit_ratio gauge',
+            f'{PROM_PREFIX}_cache_hit_ratio{{{label}}} {s["cache_hit_ratio"]}',
+            f'# TYPE {PROM_PREFIX}_run_duration_seconds gauge',
+            f'{PROM_PREFIX}_run_duration_seconds{{{label}}} {s["duration_sec"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Write a node_exporter textfile-collector file (atomically, so it is never read half-written)."""
+        _atomic_write(path, self.prometheus_text())
+
+    def start_live(self, interval_sec: float, out: TextIO = sys.stderr):
+        """Print a one-line JSON snapshot to `out` every `interval_sec` until `stop_live()`."""
+        if interval_sec <= 0 or self._live is not None:
+            return
+
+        def loop():
+            while not self._live_stop.wait(interval_sec):
+                snap = self.summary()
+                snap['latency_sec'].pop('buckets', None)
+                print(json.dumps(snap, ensure_ascii=False), file=out, flush=True)
+
+        self._live = threading.Thread(target=loop, daemon=True)
+        self._live.start()
+
+    def stop_live(self):
+        if self._live is not None:
+            self._live_stop.set()
+            self._live.join()
+            self._live = None
+
+    def export(self, *, json_path: Optional[str] = None, prom_path: Optional[str] = None):
+        self.stop_live()
+        if json_path:
+            self.write_json(json_path)
+        if prom_path:
+            self.write_prometheus(prom_path)
+
+    def append_history(self, path: str, **context: Any):
+        """Append this run's throughput to the JSONL history that `--plan` projects from."""
+        s = self.summary()
+        if not path or not s['requests']:
+            return
+        record = {
+            'script': s['script'],
+            'finished_at': round(time.time(), 3),
+            'duration_sec': s['duration_sec'],
+            'requests': s['requests'],
+            'latency_sum_sec': s['latency_sec']['sum'],
+            'rows_sent': s['rows_sent'],
+            'rows_received': s['rows_received'],
+            'prompt_tokens': s['prompt_tokens'],
+            'completion_tokens': s['completion_tokens'],
+            **context,
+        }
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    if not path or not os.path.exists(path):
+        return out
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('requests'):
+                out.append(record)
+    return out
+
+
+def project_duration(history: List[Dict[str, Any]], *, rows: int, requests: int, concurrency: int, rpm: float = 0) -> Tuple[Optional[float], str]:
+    """
+    Projected wall time for `rows` rows in `requests` requests, and a note on
+    what it is based on. Runs at the same concurrency give rows/sec directly;
+    otherwise the mean request latency is spread over `concurrency` workers.
+    An `rpm` quota puts a floor under the result.
+    """
+    same = [r for r in history if r.get('concurrency') == concurrency and r.get('rows_received') and r.get('duration_sec')]
+    seconds: Optional[float] = None
+    basis = 'no recorded runs'
+    if same:
+        rate = sum(r['rows_received'] for r in same) / sum(r['duration_sec'] for r in same)
+        seconds = rows / rate if rate > 0 else None
+        basis = f'{len(same)} recorded run(s) at concurrency {concurrency}, {rate:.1f} rows/s'
+    elif history:
+        per_request = sum(r.get('latency_sum_sec', 0) for r in history) / sum(r['requests'] for r in history)
+        seconds = requests * per_request / max(1, concurrency)
+        basis = f'{len(history)} recorded run(s), {per_request:.1f}s per request over {concurrency} worker(s)'
+    if rpm and requests:
+        floor = requests * 60.0 / rpm
+        if seconds is None or floor > seconds:
+            seconds = floor
+            basis += f'; bounded by --rpm {rpm:g}'
+    return seconds, basis
@@ -5,8 +5,9 @@ import argparse
 import json
 import os
 import re
-from collections import Counter, defaultdict
-from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 
 ALLOWED_TAGS = {
@@ -93,34 +94,135 @@ def _lower(s: str) -> str:
     return _norm(s).lower()
 
 
-def _first_word(s: str) -> str:
-    return _lower(s).split(" ", 1)[0] if _lower(s) else ""
-
-
 def _match_text(s: str) -> str:
     s = _lower(s)
     s = re.sub(r"[^0-9a-zäöüß]+", " ", s)
     return re.sub(r"\s+", " ", s).strip()
 
 
-def _has_any(s: str, keywords: List[str]) -> bool:
-    hay = f" {_match_text(s)} "
-    for kw in keywords:
-        k = _match_text(kw)
-        if not k:
-            continue
-        if f" {k} " in hay:
+class _Keywords:
+    """
+    A keyword list normalized with `_match_text` once: single words go in a
+    set, multi-word phrases in sets of token tuples keyed by length. Keywords
+    that normalize to nothing (e.g. Persian script) never match.
+    """
+
+    __slots__ = ("words", "phrases")
+
+    def __init__(self, keywords: Tuple[str, ...]):
+        self.words = set()
+        self.phrases: Dict[int, set] = {}
+        for kw in keywords:
+            toks = tuple(_match_text(kw).split())
+            if len(toks) == 1:
+                self.words.add(toks[0])
+            elif toks:
+                self.phrases.setdefault(len(toks), set()).add(toks)
+
+    def match(self, toks: Tuple[str, ...]) -> bool:
+        """True if a keyword occurs in the `_match_text` tokens `toks` as whole words."""
+        if not self.words.isdisjoint(toks):
             return True
-    return False
+        for n, group in self.phrases.items():
+            for i in range(len(toks) - n + 1):
+                if toks[i:i + n] in group:
+                    return True
+        return False
 
 
-def _contains_any(s: str, needles: List[str]) -> bool:
-    hay = _match_text(s)
-    for n in needles:
-        needle = _match_text(n)
-        if needle and needle in hay:
-            return True
-    return False
+class NormalizedItem:
+    """
+    The forms of one item's German word and English/Persian translations that
+    the tagging rules look at, computed once per item: `de` is the
+    whitespace-normalized word, `*_lower` its lowercase form, `*_match` the
+    `_match_text` form and `*_tokens` that form split into words.
+    """
+
+    __slots__ = ("word", "de", "de_lower", "de_first", "de_match", "en_lower", "en_match", "en_tokens", "fa_match", "fa_tokens")
+
+    def __init__(self, word: str, translation_en: str, translation_fa: str):
+        self._set_word(word)
+        self.en_lower = _lower(translation_en)
+        self.en_match = _match_text(translation_en)
+        self.en_tokens = tuple(self.en_match.split())
+        self.fa_match = _match_text(translation_fa)
+        self.fa_tokens = tuple(self.fa_match.split())
+
+    def _set_word(self, word: str):
+        self.word = word
+        self.de = _norm(word)
+        self.de_lower = self.de.lower()
+        self.de_first = self.de_lower.split(" ", 1)[0]
+        self.de_match = _match_text(word)
+
+    def with_word(self, word: str) -> "NormalizedItem":
+        """A copy with another German word and the same translations."""
+        other = NormalizedItem.__new__(NormalizedItem)
+        other._set_word(word)
+        for name in ("en_lower", "en_match", "en_tokens", "fa_match", "fa_tokens"):
+            setattr(other, name, getattr(self, name))
+        return other
+
+
+class _NeedleMatcher:
+    """
+    Aho-Corasick automaton over substring needles, each owned by a rule.
+    Needles are normalized with `_match_text` when the automaton is built,
+    and one left-to-right pass over a text reports every needle occurring in
+    it, however many lists and needles there are.
+    """
+
+    def __init__(self, rules: Dict[Any, List[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        for owner, needles in rules.items():
+            for n in needles:
+                needle = _match_text(n)
+                if needle:
+                    self._insert(needle, owner)
+        self._link()
+
+    def _insert(self, needle: str, owner: Any):
+        state = 0
+        for ch in needle:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((needle, owner))
+
+    def _link(self):
+        # Breadth-first, so a state's failure target is linked before the state itself.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> Iterator[Tuple[str, Any]]:
+        """Yield (needle, owner) for every needle occurrence in `text` (already `_match_text`-normalized)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+    def owners(self, text: str) -> Set[Any]:
+        """Rules with at least one needle in `text`."""
+        return {owner for _, owner in self.scan(text)}
 
 
 ARTICLES = {
@@ -396,10 +498,14 @@ PROPER_NOUN_DE = {
 
 
 def infer_pos_tags(word: str, translation_en: str) -> List[str]:
-    w = _norm(word)
-    w_l = _lower(word)
-    en_l = _lower(translation_en)
-    first = _first_word(word)
+    return _pos_tags(NormalizedItem(word, translation_en, ""))
+
+
+def _pos_tags(item: NormalizedItem) -> List[str]:
+    w = item.de
+    w_l = item.de_lower
+    en_l = item.en_lower
+    first = item.de_first
     tags: List[str] = []
 
     if re.fullmatch(r"[A-ZÄÖÜ]{2,6}\.?", w.strip()):
@@ -512,34 +618,51 @@ def infer_pos_tags(word: str, translation_en: str) -> List[str]:
     return _dedupe(tags)
 
 
-def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Optional[str]:
-    w_l = _lower(word)
-    en_l = _lower(translation_en)
-    fa_l = _lower(translation_fa)
-    w_m = _match_text(word)
-    en_m = _match_text(translation_en)
-    fa_m = _match_text(translation_fa)
-
-    # Proper nouns (conservative)
-    if (
-        w_l in PROPER_NOUN_DE
-        or en_l in PROPER_NOUN_DE
-        or re.fullmatch(r"[A-ZÄÖÜ][a-zäöüß]+", _norm(word)) and en_l in {"germany", "austria", "switzerland"}
-    ):
-        return "proper_noun"
-
-    # Greetings / politeness / conversational templates
-    if "?" in word or (en_l.startswith(("how ", "where ", "when ", "why ", "what ", "who "))) or _first_word(word) in QUESTION_WORDS:
-        return "questions_answers"
+class TopicRule(NamedTuple):
+    """
+    One condition of the topical classifier. `field` names an attribute of
+    `NormalizedItem`, and `kind` says how `keywords` are matched against it:
+
+    - "words": any keyword occurs as whole words (`*_tokens` fields)
+    - "substring": any keyword is a substring (German word only)
+    - "equals": the field is one of the keywords
+    - "prefix": the field starts with one of the keywords
+    - "pattern": the field fully matches the regex in `keywords`
+    - "check": `keywords` is a predicate over the whole `NormalizedItem`
+
+    The tag of the lowest-priority matching rule wins; rules that share a
+    priority are alternatives of one condition.
+    """
 
-    if _contains_any(word, ["hallo", "hi", "tschüss", "auf wiedersehen", "guten morgen", "guten tag", "guten abend", "gute nacht", "willkommen", "entschuldigung", "danke", "bitte"]):
-        return "greetings_politeness"
+    priority: int
+    tag: str
+    field: str
+    kind: str
+    keywords: Any
 
-    if _contains_any(word, ["mein name ist", "wie geht", "ich heiße", "freut mich", "keine ahnung", "bis bald", "bis später"]):
-        return "conversation_phrases"
 
-    if _has_any(
-        en_m,
+TOPIC_RULES: List[TopicRule] = [
+    # Proper nouns (conservative)
+    TopicRule(10, "proper_noun", "de_lower", "equals", PROPER_NOUN_DE),
+    TopicRule(10, "proper_noun", "en_lower", "equals", PROPER_NOUN_DE),
+    TopicRule(
+        10,
+        "proper_noun",
+        "de",
+        "check",
+        lambda f: re.fullmatch(r"[A-ZÄÖÜ][a-zäöüß]+", f.de) and f.en_lower in {"germany", "austria", "switzerland"},
+    ),
+    # Greetings / politeness / conversational templates
+    TopicRule(20, "questions_answers", "word", "check", lambda f: "?" in f.word),
+    TopicRule(20, "questions_answers", "en_lower", "prefix", ("how ", "where ", "when ", "why ", "what ", "who ")),
+    TopicRule(20, "questions_answers", "de_first", "equals", QUESTION_WORDS),
+    TopicRule(30, "greetings_politeness", "de_match", "substring", ["hallo", "hi", "tschüss", "auf wiedersehen", "guten morgen", "guten tag", "guten abend", "gute nacht", "willkommen", "entschuldigung", "danke", "bitte"]),
+    TopicRule(40, "conversation_phrases", "de_match", "substring", ["mein name ist", "wie geht", "ich heiße", "freut mich", "keine ahnung", "bis bald", "bis später"]),
+    TopicRule(
+        50,
+        "conversation_phrases",
+        "en_tokens",
+        "words",
         [
             "name",
             "first name",
@@ -552,38 +675,33 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "age",
             "nationality",
         ],
-    ) or _contains_any(w_m, ["vorname", "nachname", "adresse", "postleitzahl", "telefonnummer", "alter"]):
-        return "conversation_phrases"
-
-    if en_m in {"english", "french", "german", "persian", "pashto"} or _contains_any(w_m, ["englisch", "französisch", "deutsch", "persisch", "paschtu", "pashto"]):
-        return "school_learning"
-
+    ),
+    TopicRule(50, "conversation_phrases", "de_match", "substring", ["vorname", "nachname", "adresse", "postleitzahl", "telefonnummer", "alter"]),
+    TopicRule(60, "school_learning", "en_match", "equals", {"english", "french", "german", "persian", "pashto"}),
+    TopicRule(60, "school_learning", "de_match", "substring", ["englisch", "französisch", "deutsch", "persisch", "paschtu", "pashto"]),
     # Time / date
-    if _has_any(en_m, ["time", "date", "today", "tomorrow", "yesterday", "hour", "minute", "week", "month", "year"]) or w_l in TIME_EXPRESSIONS:
-        return "time_date"
-
-    if en_l in DAYS_EN or en_l in MONTHS_EN or en_l in SEASONS_EN:
-        return "days_months_seasons"
-
+    TopicRule(70, "time_date", "en_tokens", "words", ["time", "date", "today", "tomorrow", "yesterday", "hour", "minute", "week", "month", "year"]),
+    TopicRule(70, "time_date", "de_lower", "equals", TIME_EXPRESSIONS),
+    TopicRule(80, "days_months_seasons", "en_lower", "equals", DAYS_EN | MONTHS_EN | SEASONS_EN),
     # Numbers / math
-    if w_l in GERMAN_NUMBER_WORDS or re.fullmatch(r"\d+([.,]\d+)?", w_l) or _has_any(en_m, ["percent", "plus", "minus", "times", "divide"]):
-        return "numbers_math"
-
+    TopicRule(90, "numbers_math", "de_lower", "equals", GERMAN_NUMBER_WORDS),
+    TopicRule(90, "numbers_math", "de_lower", "pattern", r"\d+([.,]\d+)?"),
+    TopicRule(90, "numbers_math", "en_tokens", "words", ["percent", "plus", "minus", "times", "divide"]),
     # Colors / shapes
-    if en_m in COLORS_EN or en_m in SHAPES_EN or _has_any(en_m, list(COLORS_EN | SHAPES_EN)):
-        return "colors_shapes"
-
+    TopicRule(100, "colors_shapes", "en_match", "equals", COLORS_EN | SHAPES_EN),
+    TopicRule(100, "colors_shapes", "en_tokens", "words", COLORS_EN | SHAPES_EN),
     # Weather
-    if _has_any(en_m, ["weather", "rain", "snow", "wind", "cloud", "sun", "sunny", "storm", "temperature"]) or _has_any(fa_m, ["هوا", "باران", "برف"]):
-        return "weather"
-
+    TopicRule(110, "weather", "en_tokens", "words", ["weather", "rain", "snow", "wind", "cloud", "sun", "sunny", "storm", "temperature"]),
+    TopicRule(110, "weather", "fa_tokens", "words", ["هوا", "باران", "برف"]),
     # Directions / navigation
-    if _has_any(en_m, ["left", "right", "straight", "near", "far", "direction", "turn", "map"]) or w_l in PLACE_EXPRESSIONS:
-        return "directions_navigation"
-
+    TopicRule(120, "directions_navigation", "en_tokens", "words", ["left", "right", "straight", "near", "far", "direction", "turn", "map"]),
+    TopicRule(120, "directions_navigation", "de_lower", "equals", PLACE_EXPRESSIONS),
     # Places / buildings
-    if _has_any(
-        en_m,
+    TopicRule(
+        130,
+        "places_buildings",
+        "en_tokens",
+        "words",
         [
             "school",
             "university",
@@ -601,45 +719,28 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "city",
             "street",
         ],
-    ):
-        return "places_buildings"
-
-    if _contains_any(w_m, ["schule", "berufskolleg", "fachschule", "uni", "universität"]):
-        return "school_learning"
-
-    if _contains_any(w_m, ["amt", "behörde", "antrag", "anmeldung", "zulassung", "ausweis", "pass", "visum", "versicherung"]):
-        return "services_authorities"
-
-    if _contains_any(w_m, ["arbeit", "arbeits", "beruf", "firma", "vertrag", "gehalt", "bewerbung", "vorstellungsgespräch", "interview"]):
-        return "work_office"
-
-    if _contains_any(w_m, ["kurs", "klasse", "prüfung", "hausaufgabe", "buch", "text", "dialog", "wort", "satz", "grammatik", "alphabet"]):
-        return "school_learning"
-
+    ),
+    TopicRule(140, "school_learning", "de_match", "substring", ["schule", "berufskolleg", "fachschule", "uni", "universität"]),
+    TopicRule(150, "services_authorities", "de_match", "substring", ["amt", "behörde", "antrag", "anmeldung", "zulassung", "ausweis", "pass", "visum", "versicherung"]),
+    TopicRule(160, "work_office", "de_match", "substring", ["arbeit", "arbeits", "beruf", "firma", "vertrag", "gehalt", "bewerbung", "vorstellungsgespräch", "interview"]),
+    TopicRule(170, "school_learning", "de_match", "substring", ["kurs", "klasse", "prüfung", "hausaufgabe", "buch", "text", "dialog", "wort", "satz", "grammatik", "alphabet"]),
     # City / transport
-    if _has_any(en_m, ["bus", "train", "tram", "subway", "metro", "ticket", "taxi", "bicycle", "bike", "car", "traffic", "station", "platform", "stop"]):
-        return "city_transport"
-
+    TopicRule(180, "city_transport", "en_tokens", "words", ["bus", "train", "tram", "subway", "metro", "ticket", "taxi", "bicycle", "bike", "car", "traffic", "station", "platform", "stop"]),
     # Travel / holidays
-    if _has_any(en_m, ["travel", "trip", "vacation", "holiday", "passport", "luggage", "flight", "booking", "reservation", "tourist"]):
-        return "travel_holidays"
-
-    if _has_any(en_m, ["easter", "christmas", "new year"]) or _has_any(fa_m, ["عید", "کریسمس"]):
-        return "culture_events"
-
+    TopicRule(190, "travel_holidays", "en_tokens", "words", ["travel", "trip", "vacation", "holiday", "passport", "luggage", "flight", "booking", "reservation", "tourist"]),
+    TopicRule(200, "culture_events", "en_tokens", "words", ["easter", "christmas", "new year"]),
+    TopicRule(200, "culture_events", "fa_tokens", "words", ["عید", "کریسمس"]),
     # Home / household / furniture / rooms
-    if _has_any(en_m, ["apartment", "flat", "house", "home", "rent", "neighbor", "garden"]) or _has_any(fa_m, ["خانه", "آپارتمان"]):
-        return "home_household"
-
-    if _has_any(en_m, ["room", "kitchen", "bathroom", "bedroom", "living room", "chair", "table", "bed", "sofa", "wardrobe", "closet"]):
-        return "furniture_rooms"
-
+    TopicRule(210, "home_household", "en_tokens", "words", ["apartment", "flat", "house", "home", "rent", "neighbor", "garden"]),
+    TopicRule(210, "home_household", "fa_tokens", "words", ["خانه", "آپارتمان"]),
+    TopicRule(220, "furniture_rooms", "en_tokens", "words", ["room", "kitchen", "bathroom", "bedroom", "living room", "chair", "table", "bed", "sofa", "wardrobe", "closet"]),
     # Kitchen / cooking / food & drink
-    if _has_any(en_m, ["cook", "bake", "fry", "boil", "kitchen", "recipe"]):
-        return "kitchen_cooking"
-
-    if _has_any(
-        en_m,
+    TopicRule(230, "kitchen_cooking", "en_tokens", "words", ["cook", "bake", "fry", "boil", "kitchen", "recipe"]),
+    TopicRule(
+        240,
+        "food_drink",
+        "en_tokens",
+        "words",
         [
             "food",
             "drink",
@@ -661,20 +762,17 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "dinner",
             "restaurant",
         ],
-    ):
-        return "food_drink"
-
+    ),
     # Shopping / money
-    if _has_any(en_m, ["buy", "sell", "pay", "price", "money", "euro", "cash", "card", "receipt", "bill", "change", "discount", "shopping", "purchase"]):
-        return "shopping_money"
-
+    TopicRule(250, "shopping_money", "en_tokens", "words", ["buy", "sell", "pay", "price", "money", "euro", "cash", "card", "receipt", "bill", "change", "discount", "shopping", "purchase"]),
     # Clothing / fashion
-    if _has_any(en_m, ["shirt", "t shirt", "dress", "pants", "trousers", "skirt", "jacket", "coat", "shoes", "sock", "hat", "clothes"]):
-        return "clothing_fashion"
-
+    TopicRule(260, "clothing_fashion", "en_tokens", "words", ["shirt", "t shirt", "dress", "pants", "trousers", "skirt", "jacket", "coat", "shoes", "sock", "hat", "clothes"]),
     # Health / body
-    if _has_any(
-        en_m,
+    TopicRule(
+        270,
+        "health_body",
+        "en_tokens",
+        "words",
         [
             "doctor",
             "hospital",
@@ -698,16 +796,16 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "stomach",
             "back",
         ],
-    ):
-        return "health_body"
-
+    ),
     # Feelings / emotions
-    if _has_any(en_m, ["happy", "sad", "angry", "afraid", "fear", "anxious", "tired", "bored", "excited", "love", "hate", "happiness", "luck", "satisfied", "great", "grateful", "good", "bad", "nice", "beautiful", "ok", "okay", "shock", "concern"]) or _has_any(fa_m, ["خوشحال", "غم", "عصبانی", "ترس"]):
-        return "feelings_emotions"
-
+    TopicRule(280, "feelings_emotions", "en_tokens", "words", ["happy", "sad", "angry", "afraid", "fear", "anxious", "tired", "bored", "excited", "love", "hate", "happiness", "luck", "satisfied", "great", "grateful", "good", "bad", "nice", "beautiful", "ok", "okay", "shock", "concern"]),
+    TopicRule(280, "feelings_emotions", "fa_tokens", "words", ["خوشحال", "غم", "عصبانی", "ترس"]),
     # People / family / relationships
-    if _has_any(
-        en_m,
+    TopicRule(
+        290,
+        "people_family",
+        "en_tokens",
+        "words",
         [
             "mother",
             "father",
@@ -731,15 +829,15 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "mr",
             "mrs",
         ],
-    ) or _has_any(fa_m, ["مادر", "پدر", "خواهر", "برادر", "خانواده"]):
-        return "people_family"
-
-    if _has_any(en_m, ["friend", "boyfriend", "girlfriend", "husband", "wife", "marriage", "relationship", "date", "marital status"]):
-        return "relationships"
-
+    ),
+    TopicRule(290, "people_family", "fa_tokens", "words", ["مادر", "پدر", "خواهر", "برادر", "خانواده"]),
+    TopicRule(300, "relationships", "en_tokens", "words", ["friend", "boyfriend", "girlfriend", "husband", "wife", "marriage", "relationship", "date", "marital status"]),
     # School / learning
-    if _has_any(
-        en_m,
+    TopicRule(
+        310,
+        "school_learning",
+        "en_tokens",
+        "words",
         [
             "learn",
             "study",
@@ -764,52 +862,108 @@ def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Op
             "to understand",
             "to spell",
         ],
-    ):
-        return "school_learning"
-
+    ),
     # Work / office / jobs
-    if _has_any(en_m, ["work", "office", "meeting", "boss", "colleague", "company", "salary", "contract", "interview", "application", "deadline", "financial", "leadership", "management"]):
-        return "work_office"
-
-    if _has_any(en_m, ["job", "profession", "engineer", "doctor", "teacher", "driver", "cook", "police officer", "nurse"]):
-        return "jobs_professions"
-
+    TopicRule(320, "work_office", "en_tokens", "words", ["work", "office", "meeting", "boss", "colleague", "company", "salary", "contract", "interview", "application", "deadline", "financial", "leadership", "management"]),
+    TopicRule(330, "jobs_professions", "en_tokens", "words", ["job", "profession", "engineer", "doctor", "teacher", "driver", "cook", "police officer", "nurse"]),
     # Technology / internet / media
-    if _has_any(en_m, ["computer", "phone", "smartphone", "internet", "website", "email", "password", "app", "wifi", "install", "copy", "download", "upload", "update", "file", "print", "printer", "digitalization", "digitalisation", "research", "invention"]):
-        return "technology_internet"
-
-    if _has_any(en_m, ["news", "newspaper", "radio", "tv", "television", "social media", "post", "message", "chat"]):
-        return "media_social"
-
+    TopicRule(340, "technology_internet", "en_tokens", "words", ["computer", "phone", "smartphone", "internet", "website", "email", "password", "app", "wifi", "install", "copy", "download", "upload", "update", "file", "print", "printer", "digitalization", "digitalisation", "research", "invention"]),
+    TopicRule(350, "media_social", "en_tokens", "words", ["news", "newspaper", "radio", "tv", "television", "social media", "post", "message", "chat"]),
     # Hobbies / sports
-    if _has_any(en_m, ["sport", "football", "soccer", "tennis", "swim", "run", "gym", "music", "dance", "hobby", "jogging"]):
-        return "hobbies_sports"
-
+    TopicRule(360, "hobbies_sports", "en_tokens", "words", ["sport", "football", "soccer", "tennis", "swim", "run", "gym", "music", "dance", "hobby", "jogging"]),
     # Nature / animals / plants / environment
-    if _has_any(en_m, ["dog", "cat", "animal", "bird", "horse", "cow", "fish"]) or _has_any(fa_m, ["سگ", "گربه", "حیوان"]):
-        return "nature_animals"
+    TopicRule(370, "nature_animals", "en_tokens", "words", ["dog", "cat", "animal", "bird", "horse", "cow", "fish"]),
+    TopicRule(370, "nature_animals", "fa_tokens", "words", ["سگ", "گربه", "حیوان"]),
+    TopicRule(380, "plants_environment", "en_tokens", "words", ["tree", "flower", "plant", "forest", "environment", "recycle", "climate", "nature"]),
+    TopicRule(380, "plants_environment", "fa_tokens", "words", ["درخت", "گل", "محیط"]),
+    # Culture / events
+    TopicRule(390, "culture_events", "en_tokens", "words", ["culture", "festival", "concert", "museum", "theatre", "cinema", "party", "event", "club", "disco"]),
+    # Services / authorities / safety / law
+    TopicRule(400, "services_authorities", "en_tokens", "words", ["police", "passport office", "embassy", "authority", "government", "office", "court", "confirmation", "validity", "citizenship", "naturalization", "document", "certificate", "permit", "registration"]),
+    TopicRule(410, "safety_emergency", "en_tokens", "words", ["emergency", "help", "fire", "danger", "ambulance"]),
+    TopicRule(420, "law_rules", "en_tokens", "words", ["law", "rule", "fine", "ticket", "illegal"]),
+    TopicRule(430, "religion_culture", "en_tokens", "words", ["church", "mosque", "prayer", "religion"]),
+]
 
-    if _has_any(en_m, ["tree", "flower", "plant", "forest", "environment", "recycle", "climate", "nature"]) or _has_any(fa_m, ["درخت", "گل", "محیط"]):
-        return "plants_environment"
 
-    # Culture / events
-    if _has_any(en_m, ["culture", "festival", "concert", "museum", "theatre", "cinema", "party", "event", "club", "disco"]):
-        return "culture_events"
+class _TopicIndex:
+    """
+    TOPIC_RULES compiled for lookup. Whole-word rules are indexed by each
+    keyword's (first) token and equality rules by value, and the substring
+    needles of all rules share one `_NeedleMatcher`. An item then only tests
+    the rules its own tokens and values point to, plus the few rules that
+    cannot be indexed ("prefix", "pattern", "check"), in priority order.
+    """
 
-    # Services / authorities / safety / law
-    if _has_any(en_m, ["police", "passport office", "embassy", "authority", "government", "office", "court", "confirmation", "validity", "citizenship", "naturalization", "document", "certificate", "permit", "registration"]):
-        return "services_authorities"
+    def __init__(self, rules: List[TopicRule]):
+        self.rules = sorted(rules, key=lambda r: r.priority)
+        self._keywords: Dict[int, _Keywords] = {}
+        self._by_token: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        self._by_value: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        self._always: List[int] = []
+        needles: Dict[int, List[str]] = {}
+        for i, rule in enumerate(self.rules):
+            if rule.field not in NormalizedItem.__slots__:
+                raise ValueError(f"unknown rule field: {rule.field}")
+            if rule.kind == "words":
+                if not rule.field.endswith("_tokens"):
+                    raise ValueError(f"words rules apply to *_tokens fields, not {rule.field}")
+                kw = self._keywords[i] = _Keywords(tuple(rule.keywords))
+                for tok in kw.words:
+                    self._by_token[(rule.field, tok)].append(i)
+                for group in kw.phrases.values():
+                    for phrase in group:
+                        self._by_token[(rule.field, phrase[0])].append(i)
+            elif rule.kind == "equals":
+                for value in rule.keywords:
+                    self._by_value[(rule.field, value)].append(i)
+            elif rule.kind == "substring":
+                if rule.field != "de_match":
+                    raise ValueError(f"substring rules only apply to de_match, not {rule.field}")
+                needles[i] = list(rule.keywords)
+            elif rule.kind in ("prefix", "pattern", "check"):
+                self._always.append(i)
+            else:
+                raise ValueError(f"unknown rule kind: {rule.kind}")
+        self._token_fields = sorted({f for f, _ in self._by_token})
+        self._value_fields = sorted({f for f, _ in self._by_value})
+        self._needles = _NeedleMatcher(needles)
+
+    def _matches(self, i: int, item: NormalizedItem) -> bool:
+        rule = self.rules[i]
+        value = getattr(item, rule.field)
+        if rule.kind == "words":
+            return self._keywords[i].match(value)
+        if rule.kind == "equals":
+            return value in rule.keywords
+        if rule.kind == "prefix":
+            return value.startswith(tuple(rule.keywords))
+        if rule.kind == "pattern":
+            return re.fullmatch(rule.keywords, value) is not None
+        return bool(rule.keywords(item))
+
+    def first_match(self, item: NormalizedItem) -> Optional[str]:
+        hits = self._needles.owners(item.de_match)
+        candidates = set(self._always) | hits
+        for field in self._token_fields:
+            for tok in getattr(item, field):
+                candidates.update(self._by_token.get((field, tok), ()))
+        for field in self._value_fields:
+            candidates.update(self._by_value.get((field, getattr(item, field)), ()))
+        for i in sorted(candidates):
+            if i in hits or self._matches(i, item):
+                return self.rules[i].tag
+        return None
+
+
+_TOPIC_INDEX = _TopicIndex(TOPIC_RULES)
 
-    if _has_any(en_m, ["emergency", "help", "fire", "danger", "ambulance"]):
-        return "safety_emergency"
 
-    if _has_any(en_m, ["law", "rule", "fine", "ticket", "illegal"]):
-        return "law_rules"
+def infer_topical_tag(word: str, translation_en: str, translation_fa: str) -> Optional[str]:
+    return _TOPIC_INDEX.first_match(NormalizedItem(word, translation_en, translation_fa))
 
-    if _has_any(en_m, ["church", "mosque", "prayer", "religion"]):
-        return "religion_culture"
 
-    return None
+_ABSTRACT_EN = _Keywords(("tion", "ness", "ment", "ship", "ism", "ability"))
 
 
 def _dedupe(tags: List[str]) -> List[str]:
@@ -825,20 +979,21 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
     en = str(item.get("translation_en", "") or "")
     fa = str(item.get("translation_fa", "") or "")
     level = str(item.get("level", "") or "")
+    text = NormalizedItem(word, en, fa)
 
-    topical = infer_topical_tag(word, en, fa)
-    pos_tags = infer_pos_tags(word, en)
+    topical = _TOPIC_INDEX.first_match(text)
+    pos_tags = _pos_tags(text)
 
     tags: List[str] = []
 
-    w_l = _lower(word)
+    w_l = text.de_lower
 
     # Decide topical/conversation defaults
     if topical == "proper_noun":
         tags.append("proper_noun")
         tags.append("noun")
         # Try to add a topic if we can infer it safely from translation
-        inferred_topic = infer_topical_tag(" ", en, fa)
+        inferred_topic = _TOPIC_INDEX.first_match(text.with_word(" "))
         if inferred_topic and inferred_topic != "proper_noun":
             tags.append(inferred_topic)
     elif topical:
@@ -867,11 +1022,11 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
             "fragen",
             "antworten",
         }
-        if "verb" in pos_tags and str(item.get("level", "") or "").startswith("A1") and w_l.split(" ", 1)[0] in core_verbs:
+        if "verb" in pos_tags and level.startswith("A1") and text.de_first in core_verbs:
             tags.append("daily_life")
 
     # Add conversation tags where appropriate
-    w_norm = _norm(word)
+    w_norm = text.de
     if topical in {"greetings_politeness", "questions_answers"}:
         tags.append("conversation_phrases")
     if "!" in w_norm and "conversation_phrases" not in tags and len(w_norm.split()) > 1:
@@ -883,12 +1038,11 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
             tags.append(t)
 
     # loanword_international (conservative list)
-    if _lower(word) in {"hotel", "restaurant", "internet", "computer", "radio", "taxi", "telefon"}:
+    if w_l in {"hotel", "restaurant", "internet", "computer", "radio", "taxi", "telefon"}:
         tags.append("loanword_international")
 
     # a1_core (conservative: only when highly likely)
-    w_first = _first_word(word)
-    w_l = _lower(word)
+    w_first = text.de_first
     core_words = (
         w_l in COMMON_ADVERBS
         or w_first in ARTICLES
@@ -905,12 +1059,10 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
     if level.startswith("A1") and core_words:
         tags.append("a1_core")
 
-    def looks_abstract(german: str, english: str) -> bool:
-        g = _lower(german)
-        e = _match_text(english)
-        if re.search(r"(ung|heit|keit|schaft|tät|tion|ismus|ment)$", g):
+    def looks_abstract(t: NormalizedItem) -> bool:
+        if re.search(r"(ung|heit|keit|schaft|tät|tion|ismus|ment)$", t.de_lower):
             return True
-        if _has_any(e, ["tion", "ness", "ment", "ship", "ism", "ability"]):
+        if _ABSTRACT_EN.match(t.en_tokens):
             return True
         return False
 
@@ -921,7 +1073,7 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
         and (level.startswith("A1") or level.startswith("A2"))
         and any(t in pos_tags for t in ["noun", "verb", "adjective"])
         and not any(t in pos_tags for t in ["article", "pronoun", "preposition", "conjunction", "question_word", "negation"])
-        and not looks_abstract(word, en)
+        and not looks_abstract(text)
         and not any(t in tags for t in ["greetings_politeness", "questions_answers", "conversation_phrases", "school_learning", "work_office"])
     ):
         tags.insert(0, "daily_life")
@@ -1037,6 +1189,10 @@ def build_tags(item: Dict[str, Any]) -> List[str]:
     return priority
 
 
+# Items per task handed to a worker process under --jobs.
+JOB_CHUNK_SIZE = 500
+
+
 def upsert_category_preserving_order(item: Dict[str, Any], category_tags: List[str]) -> Dict[str, Any]:
     """
     Replace legacy string `category` and `tags` with a single `category` field:
@@ -1065,11 +1221,37 @@ def upsert_category_preserving_order(item: Dict[str, Any], category_tags: List[s
     return out
 
 
+def _tag_chunk(items: List[Any]) -> Tuple[List[Any], Counter, List[Tuple[str, str]], int]:
+    """
+    Tag a run of items from one file. Returns the rewritten items, the tag
+    counts, the (id, word) pairs left uncategorized and the number of items
+    tagged. Runs in worker processes under `--jobs`.
+    """
+    out_list: List[Any] = []
+    counts: Counter[str] = Counter()
+    uncategorized: List[Tuple[str, str]] = []
+    tagged = 0
+    for item in items:
+        if not isinstance(item, dict):
+            out_list.append(item)
+            continue
+        tagged += 1
+        tags = build_tags(item)
+        for t in tags:
+            counts[t] += 1
+        if tags == ["uncategorized"]:
+            uncategorized.append((str(item.get("id", "")), str(item.get("word", ""))))
+        out_list.append(upsert_category_preserving_order(item, tags))
+    return out_list, counts, uncategorized, tagged
+
+
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--dir", default="assets/words", help="Directory containing word json files")
     ap.add_argument("--write", action="store_true", help="Write changes in-place")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes for tagging (0 = one per CPU)")
     args = ap.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
     word_files = sorted(
         os.path.join(args.dir, p)
@@ -1082,25 +1264,30 @@ def main() -> None:
     total_words = 0
 
     updated_files: Dict[str, Any] = {}
+    chunks: List[Tuple[str, List[Any]]] = []
     for path in word_files:
         data = load_json(path)
         if not isinstance(data, list):
             continue
-        out_list: List[Any] = []
-        for item in data:
-            if not isinstance(item, dict):
-                out_list.append(item)
-                continue
-            total_words += 1
-            tags = build_tags(item)
-            for t in tags:
-                tag_counts[t] += 1
-            if tags == ["uncategorized"]:
-                uncategorized_by_file[os.path.basename(path)].append(
-                    (str(item.get("id", "")), str(item.get("word", "")))
-                )
-            out_list.append(upsert_category_preserving_order(item, tags))
-        updated_files[path] = out_list
+        updated_files[path] = []
+        # Large files are split so that one file does not hold up the pool.
+        for i in range(0, len(data), JOB_CHUNK_SIZE):
+            chunks.append((path, data[i:i + JOB_CHUNK_SIZE]))
+
+    if jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as pool:
+            results = list(pool.map(_tag_chunk, [items for _, items in chunks]))
+    else:
+        results = [_tag_chunk(items) for _, items in chunks]
+
+    # Merge in file/chunk order, so counts (and most_common ties) and the
+    # uncategorized lists come out exactly as in a sequential run.
+    for (path, _), (out_list, counts, uncategorized, tagged) in zip(chunks, results):
+        updated_files[path].extend(out_list)
+        tag_counts.update(counts)
+        total_words += tagged
+        if uncategorized:
+            uncategorized_by_file[os.path.basename(path)].extend(uncategorized)
 
     if args.write:
         for path, data in updated_files.items():
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+
+import pytest
+
+from translate_words import JournaledCache, batch_main, ingest_batch_results
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RESULTS = os.path.join(FIXTURES, 'batch_output.jsonl')
+
+
+def load_index():
+    with open(os.path.join(FIXTURES, 'batch_output.index.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ingest(cache):
+    return ingest_batch_results(results_path=RESULTS, index=load_index(), cache=cache)
+
+
+def test_stats():
+    assert ingest(JournaledCache('')) == {
+        'requests_ok': 1,
+        'requests_failed': 2,  # one error line, one non-200 response
+        'unknown_ids': 1,
+        'rows_filled': 2,
+        'items_filled': 3,
+        'rows_missing': 4,  # unanswered row, two failed requests, one request with no output line
+    }
+
+
+def test_rows_are_mapped_back_by_ordinal_and_fanned_out():
+    cache = JournaledCache('')
+    ingest(cache)
+    assert cache.get('1|Hund|dog|سگ') == {'fr': 'chien', 'tr': 'köpek'}
+    assert cache.get('7|Hund|dog|سگ') == {'fr': 'chien', 'tr': 'köpek'}
+
+
+def test_only_needed_languages_are_merged():
+    cache = JournaledCache('', {'2|Katze|cat|گربه': {'fr': 'chatte'}})
+    ingest(cache)
+    assert cache.get('2|Katze|cat|گربه') == {'fr': 'chatte', 'tr': 'kedi'}
+
+
+def test_failed_and_missing_rows_stay_pending():
+    cache = JournaledCache('')
+    ingest(cache)
+    for key in ('3|Maus|mouse|موش', '4|Haus|house|خانه', '5|Baum|tree|درخت', '6|Buch|book|کتاب'):
+        assert key not in cache
+    assert len(cache) == 3
+
+
+def test_ingest_without_index_asks_for_emit(tmp_path):
+    args = argparse.Namespace(batch_file=str(tmp_path / 'batch.jsonl'), batch_ingest=RESULTS, batch_emit=False)
+    with pytest.raises(SystemExit, match='--batch-emit'):
+        batch_main(args, default_cache=str(tmp_path / 'cache.json'))
+    assert not os.path.exists(tmp_path / 'cache.json')
@@ -0,0 +1,43 @@
+import pytest
+
+from do_not_translate import DoNotTranslate
+from translate_words import JournaledCache, build_cache_key, collect_pending
+
+
+def item(de, **extra):
+    return dict({'id': 1, 'words': {'de': de, 'en': de.lower(), 'fa': 'x'}}, **extra)
+
+
+@pytest.mark.parametrize('de', ['WLAN', 'IT', '40-Stunden-Woche 40', 'info@example.de'])
+def test_fr_tr_translate_words_the_pashto_rules_would_copy(de):
+    pending, changed, _ = collect_pending([item(de)], JournaledCache(''), targets=('fr', 'tr'))
+    assert changed == 0
+    assert [entry[3] for entry in pending] == [('fr', 'tr')]
+
+
+def test_pashto_rules_only_copy_into_ps():
+    data = [item('WLAN')]
+    pending, changed, _ = collect_pending(data, JournaledCache(''), targets=('ps', 'fr'))
+    assert changed == 1
+    assert data[0]['words']['ps'] == 'WLAN'
+    assert [entry[3] for entry in pending] == [('fr',)]
+
+
+def test_cached_translation_wins_over_verbatim_copy():
+    data = [item('WLAN', dont_translate=True)]
+    cache = JournaledCache('', {build_cache_key(data[0], ('fr', 'tr')): {'fr': 'Wi-Fi'}})
+    pending, changed, _ = collect_pending(data, cache, targets=('fr', 'tr'))
+    assert pending == []
+    assert changed == 2
+    assert data[0]['words']['fr'] == 'Wi-Fi'
+    assert data[0]['words']['tr'] == 'WLAN'
+
+
+def test_existing_target_value_is_kept():
+    data = [item('IT')]
+    data[0]['words']['fr'] = 'informatique'
+    dnt = DoNotTranslate(['IT'], [], [])
+    pending, changed, _ = collect_pending(data, JournaledCache(''), targets=('fr', 'tr'), dnt=dnt)
+    assert pending == []
+    assert changed == 1
+    assert data[0]['words'] == {'de': 'IT', 'en': 'it', 'fa': 'x', 'fr': 'informatique', 'tr': 'IT'}
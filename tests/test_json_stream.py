@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from json_stream import report_lost, salvage_json_array
+
+
+def test_clean_array_is_returned_as_is():
+    rows, clean = salvage_json_array('```json\n[{"key": "0", "fr": "chien"}]\n```')
+    assert clean
+    assert rows == [{'key': '0', 'fr': 'chien'}]
+
+
+def test_trailing_commas():
+    rows, clean = salvage_json_array('[{"key": "0", "fr": "chien",}, {"key": "1", "fr": "chat"},]')
+    assert not clean
+    assert rows == [{'key': '0', 'fr': 'chien'}, {'key': '1', 'fr': 'chat'}]
+
+
+def test_unescaped_quote_inside_value():
+    rows, clean = salvage_json_array('[{"key": "0", "fr": "le "chat" noir", "tr": "kara kedi"}, {"key": "1", "fr": "chien"}]')
+    assert not clean
+    assert rows == [
+        {'key': '0', 'fr': 'le "chat" noir', 'tr': 'kara kedi'},
+        {'key': '1', 'fr': 'chien'},
+    ]
+
+
+@pytest.mark.parametrize('broken', [
+    '{"key":"0","fr":"x" "tr":"y"}',
+    '{"key":"0","fr":"abc,"tr":"def"}',
+])
+def test_row_with_merged_fields_is_dropped(broken):
+    rows, clean = salvage_json_array('[' + broken + ', {"key": "1", "fr": "chat", "tr": "kedi"}]')
+    assert not clean
+    assert rows == [{'key': '1', 'fr': 'chat', 'tr': 'kedi'}]
+
+
+def test_truncated_tail_drops_only_the_open_row():
+    rows, clean = salvage_json_array('[{"key": "0", "fr": "chien"}, {"key": "1", "fr": "ch')
+    assert not clean
+    assert rows == [{'key': '0', 'fr': 'chien'}]
+
+
+def test_no_array_or_no_object_raises():
+    with pytest.raises(ValueError):
+        salvage_json_array('Sorry, I cannot help with that.')
+    with pytest.raises(ValueError):
+        salvage_json_array('[{"key": "0", "fr": "ch')
+
+
+def test_report_lost_names_item_ids():
+    out = io.StringIO()
+    report_lost([f'w{i}|Hund|dog|' for i in range(10)], 25, out)
+    assert out.getvalue() == 'Malformed response: recovered 15/25 rows, lost w0, w1, w2, w3, w4, w5, w6, w7 (+2 more)\n'
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+import pytest
+
+from translation_memory import TranslationMemory, encode_source, fold_source, source_tuple
+
+SOURCE = source_tuple('Hund', 'dog', 'سگ')
+
+
+def old_schema_db(path):
+    """A memory file written before the `folded` column existed."""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE translations (source TEXT NOT NULL, lang TEXT NOT NULL, text TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (source, lang)) WITHOUT ROWID')
+    conn.execute('INSERT INTO translations VALUES (?, ?, ?, ?)', (encode_source(SOURCE), 'fr', 'chien', 1.0))
+    conn.commit()
+    conn.close()
+
+
+def test_read_only_leaves_the_file_alone(tmp_path):
+    path = str(tmp_path / 'memory.sqlite3')
+    old_schema_db(path)
+    before = sorted(os.listdir(tmp_path)), os.stat(path).st_mtime_ns
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    memory = TranslationMemory(path, read_only=True)
+    assert memory.get_many(SOURCE, ['fr', 'tr']) == {'fr': 'chien'}
+    assert memory.get_folded(fold_source(SOURCE), ['fr']) == {}
+    memory.close()
+
+    assert (sorted(os.listdir(tmp_path)), os.stat(path).st_mtime_ns) == before
+    with open(path, 'rb') as f:
+        assert f.read() == content
+
+
+def test_read_only_rejects_writes(tmp_path):
+    path = str(tmp_path / 'memory.sqlite3')
+    TranslationMemory(path).close()
+    memory = TranslationMemory(path, read_only=True)
+    with pytest.raises(sqlite3.OperationalError):
+        memory.put_many(SOURCE, {'fr': 'chien'})
+    memory.close()
@@ -0,0 +1,1299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fill missing `words.<lang>` translations in assets/words/*.json for any set
+of target languages in a single pass:
+
+    python3 translate_words.py --dir assets/words --targets ps,fr,tr
+
+Each item is sent once with the languages it still lacks, so adding a target
+does not add another pass over the corpus.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from batch_jobs import index_path, read_results, request_line, stable_id, write_jsonl
+from batching import DEFAULT_MAX_BATCH_ITEMS, DEFAULT_TARGET_LATENCY_SEC, DEFAULT_TOKEN_BUDGET, TokenBudget, bisect_recover, estimate_tokens, local_key, row_tokens, wire_rows
+from do_not_translate import DoNotTranslate, is_non_translatable, load_do_not_translate
+from fuzzy_memory import DEFAULT_REUSE_SCORE, FuzzyIndex
+from json_stream import JsonArrayStream, report_lost, salvage_json_array
+from openai_http import ChatSession, RateLimiter, chat_completion, chat_completion_stream
+from run_manifest import RunManifest
+from run_metrics import DEFAULT_HISTORY_FILE, RunMetrics, load_history, project_duration
+from translation_memory import Source, TranslationMemory, source_tuple
+
+DEFAULT_API_KEY_FILE = os.path.join('.secrets', 'openai_api_key.txt')
+DEFAULT_CACHE_FILE = 'translation_cache.json'
+DEFAULT_MANIFEST_FILE = 'translate_manifest.json'
+DEFAULT_JOURNAL_COMPACT_BYTES = 1024 * 1024
+DEFAULT_FLUSH_INTERVAL_SEC = 5.0
+DEFAULT_FLUSH_EVERY_BATCHES = 10
+DEFAULT_TARGETS = ('fr', 'tr')
+# The Pashto script's digit/email/all-caps copy rules only hold for Pashto.
+VERBATIM_HEURISTICS_TARGET = 'ps'
+DEFAULT_BATCH_FILE = 'translate_batch.jsonl'
+TEMPERATURE = 0.2
+# Source languages every item is expected to carry.
+SOURCE_LANGS = ('de', 'en', 'fa')
+LANGUAGE_NAMES = {
+    'de': 'German',
+    'en': 'English',
+    'fa': 'Persian (Dari)',
+    'ps': 'Pashto',
+    'fr': 'French',
+    'tr': 'Turkish',
+    'ar': 'Arabic',
+    'es': 'Spanish',
+    'it': 'Italian',
+    'ru': 'Russian',
+    'uk': 'Ukrainian',
+}
+
+
+def load_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(path: str, data: Any):
+    # Write to a sibling temp file and rename it over the target, so an
+    # interrupted write never leaves a truncated JSON file behind.
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class LevelFileWriter:
+    """
+    Debounced writer for one level file. Changes are marked with
+    `mark_dirty()`; `batch_done()` writes at most every `flush_interval_sec`
+    seconds or `flush_every_batches` batches, and `flush()` skips the write
+    when nothing changed since the last one.
+    """
+
+    def __init__(self, path: str, data: Any, flush_interval_sec: float = DEFAULT_FLUSH_INTERVAL_SEC, flush_every_batches: int = DEFAULT_FLUSH_EVERY_BATCHES):
+        self.path = path
+        self.data = data
+        self.flush_interval_sec = flush_interval_sec
+        self.flush_every_batches = max(1, flush_every_batches)
+        self.dirty = False
+        self.writes = 0
+        self._batches = 0
+        self._last_flush = time.monotonic()
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def batch_done(self) -> bool:
+        """Count a finished batch; True when this wrote the file."""
+        self._batches += 1
+        if self._batches >= self.flush_every_batches or time.monotonic() - self._last_flush >= self.flush_interval_sec:
+            return self.flush()
+        return False
+
+    def flush(self) -> bool:
+        self._batches = 0
+        self._last_flush = time.monotonic()
+        if not self.dirty:
+            return False
+        save_json(self.path, self.data)
+        self.dirty = False
+        self.writes += 1
+        return True
+
+
+def read_secret(path: str) -> Optional[str]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        for raw in f.read().splitlines():
+            line = raw.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '=' in line:
+                k, v = line.split('=', 1)
+                if k.strip() == 'OPENAI_API_KEY' and v.strip():
+                    return v.strip().strip('"').strip("'")
+            return line.strip().strip('"').strip("'")
+    return None
+
+
+def resolve_api_key(api_key_file: Optional[str]) -> str:
+    env_key = os.environ.get('OPENAI_API_KEY', '').strip()
+    if env_key:
+        return env_key
+    for p in [api_key_file, DEFAULT_API_KEY_FILE]:
+        if not p:
+            continue
+        secret = read_secret(p)
+        if secret:
+            return secret
+    raise RuntimeError('OPENAI_API_KEY not found (env or .secrets/openai_api_key.txt)')
+
+
+def call_openai_chat(*, api_key: str, model: str, messages: List[Dict[str, str]], temperature: float, timeout_sec: float, retries: int, retry_backoff_sec: float, session: Optional[ChatSession] = None, on_text: Optional[Callable[[str], None]] = None) -> str:
+    if session is None:
+        with ChatSession() as one_shot:
+            return call_openai_chat(
+                api_key=api_key,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                timeout_sec=timeout_sec,
+                retries=retries,
+                retry_backoff_sec=retry_backoff_sec,
+                session=one_shot,
+                on_text=on_text,
+            )
+    if on_text is not None:
+        return chat_completion_stream(
+            session,
+            api_key=api_key,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            timeout_sec=timeout_sec,
+            retries=retries,
+            retry_backoff_sec=retry_backoff_sec,
+            on_text=on_text,
+        )
+    return chat_completion(
+        session,
+        api_key=api_key,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        timeout_sec=timeout_sec,
+        retries=retries,
+        retry_backoff_sec=retry_backoff_sec,
+    )
+
+
+def language_name(lang: str) -> str:
+    return LANGUAGE_NAMES.get(lang, lang)
+
+
+def system_prompt(targets: Sequence[str], hints: bool = False) -> str:
+    context = ','.join(('key',) + SOURCE_LANGS)
+    output = ','.join(('key',) + tuple(targets))
+    style = ''.join(f'{language_name(lang)} ({lang}) must be natural and concise. ' for lang in targets)
+    return (
+        'You are a professional translator. '
+        'Return ONLY valid JSON (no markdown). '
+        f'Input is an array of {{{context},...}}; other language fields are extra context '
+        'and `need` lists the language codes to produce for that row. '
+        f'Output must be an array of {{{output}}} with exactly the languages in `need`. '
+        f'{style}'
+        'If a term is a proper noun/brand/code, keep it unchanged. '
+        + ('`hints` are similar entries with known translations; keep terminology consistent with them, '
+           'but translate the row itself. ' if hints else '')
+    )
+
+
+def batch_messages(rows: List[Dict[str, Any]], targets: Sequence[str]) -> List[Dict[str, str]]:
+    return [
+        {
+            'role': 'system',
+            'content': system_prompt(targets, hints=any('hints' in row for row in rows)),
+        },
+        {
+            'role': 'user',
+            'content': json.dumps(rows, ensure_ascii=False),
+        }
+    ]
+
+
+def clean_row(row: Any, targets: Sequence[str]) -> Optional[Tuple[str, Dict[str, str]]]:
+    """(key, {lang: text}) for one row of a model response, or None if it has no key."""
+    if not isinstance(row, dict):
+        return None
+    key = str(row.get('key', '')).strip()
+    if not key:
+        return None
+    return key, {lang: str(row.get(lang, '') or '').strip().strip('"').strip("'") for lang in targets}
+
+
+def translate_batch(*, api_key: str, model: str, rows: List[Dict[str, Any]], targets: Sequence[str] = DEFAULT_TARGETS, timeout_sec: float, retries: int, retry_backoff_sec: float, session: Optional[ChatSession] = None, on_row: Optional[Callable[[str, Dict[str, str]], None]] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Translate `rows` in one request and return {key: {lang: text}}. The
+    request carries per-batch ordinals instead of the cache keys.
+
+    With `on_row` the completion is streamed and every row is passed to
+    `on_row` as soon as its JSON object closes, so rows received before a
+    timeout or disconnect are not lost when this raises.
+    """
+    out: Dict[str, Dict[str, str]] = {}
+    keys = [row['key'] for row in rows]
+
+    def add_row(row: Any, replace: bool = True):
+        cleaned = clean_row(row, targets)
+        key = local_key(cleaned[0], keys) if cleaned is not None else None
+        if key is None or (key in out and not replace):
+            return
+        out[key] = cleaned[1]
+        if on_row is not None:
+            on_row(key, out[key])
+
+    parser = JsonArrayStream() if on_row is not None else None
+
+    def on_text(text: str):
+        for row in parser.feed(text):
+            add_row(row)
+
+    content = call_openai_chat(
+        api_key=api_key,
+        model=model,
+        messages=batch_messages(wire_rows(rows), targets),
+        temperature=TEMPERATURE,
+        timeout_sec=timeout_sec,
+        retries=retries,
+        retry_backoff_sec=retry_backoff_sec,
+        session=session,
+        on_text=on_text if parser is not None else None,
+    )
+    metrics = session.metrics if session is not None else None
+    clean = True
+    # A streamed element that did not parse can throw the stream off for the
+    # rest of the array, so the full text is salvaged for what it missed.
+    if parser is None or parser.errors or not parser.closed:
+        try:
+            arr, clean = salvage_json_array(content)
+        except ValueError:
+            if parser is None or not out:
+                if metrics is not None:
+                    metrics.count(rows_sent=len(rows), parse_failures=1)
+                raise
+            arr, clean = [], False
+        for row in arr:
+            add_row(row, replace=False)
+    clean = clean and not (parser is not None and parser.errors)
+
+    lost = [key for key in keys if key not in out]
+    if not clean:
+        report_lost(lost, len(rows))
+    if metrics is not None:
+        metrics.count(rows_sent=len(rows), rows_received=len(out), parse_failures=0 if clean else 1, rows_lost=0 if clean else len(lost))
+    return out
+
+
+def context_langs(targets: Sequence[str]) -> Tuple[str, ...]:
+    """Languages that identify an item's source for `targets`: the sources plus ps unless it is a target."""
+    return SOURCE_LANGS + tuple(lang for lang in ('ps',) if lang not in targets)
+
+
+def build_cache_key(item: Dict[str, Any], targets: Sequence[str] = DEFAULT_TARGETS) -> str:
+    words = item.get('words') if isinstance(item.get('words'), dict) else {}
+    parts = [str(words.get(lang, '')).strip() for lang in context_langs(targets)]
+    return '|'.join([str(item.get('id', ''))] + parts)
+
+
+class JournaledCache:
+    """
+    Translation cache (key -> {lang: text}) kept as a JSON snapshot plus an append-only JSONL journal.
+
+    `flush()` appends only the entries added since the previous flush, so the
+    cost per batch does not grow with the cache. The journal is folded back
+    into the snapshot by `compact()` on close or once it passes
+    `compact_bytes`. An empty `path` keeps the cache in memory only.
+    """
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict[str, str]]] = None, compact_bytes: int = DEFAULT_JOURNAL_COMPACT_BYTES):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_bytes = compact_bytes
+        self.entries: Dict[str, Dict[str, str]] = entries if entries is not None else {}
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __getitem__(self, key: str) -> Dict[str, str]:
+        return self.entries[key]
+
+    def __setitem__(self, key: str, value: Dict[str, str]):
+        with self._lock:
+            self.entries[key] = value
+            self._pending[key] = value
+
+    def merge(self, key: str, translations: Dict[str, str]):
+        """Add `translations` to the entry for `key`, keeping its other languages."""
+        with self._lock:
+            value = dict(self.entries.get(key) or {}, **translations)
+            self.entries[key] = value
+            self._pending[key] = value
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str, default=None):
+        return self.entries.get(key, default)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self.path:
+            return
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            for k, v in pending.items():
+                f.write(json.dumps(dict(v, key=k), ensure_ascii=False))
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.getsize(self.journal_path) >= self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            self._pending = {}
+            snapshot = dict(self.entries)
+        save_cache(self.path, snapshot)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def close(self):
+        self.flush()
+        if self.path and os.path.exists(self.journal_path):
+            self.compact()
+
+
+def _clean_entry(v: Dict[str, Any]) -> Dict[str, str]:
+    return {str(lang): str(text or '').strip() for lang, text in v.items() if lang != 'key'}
+
+
+def load_cache(path: str, compact_bytes: int = DEFAULT_JOURNAL_COMPACT_BYTES) -> JournaledCache:
+    out: Dict[str, Dict[str, str]] = {}
+    if not path:
+        return JournaledCache(path, out, compact_bytes=compact_bytes)
+    if os.path.exists(path):
+        try:
+            data = load_json(path)
+        except Exception:
+            data = {}
+        if isinstance(data, dict):
+            for k, v in data.items():
+                if isinstance(v, dict):
+                    out[str(k)] = _clean_entry(v)
+
+    # Replay entries appended since the last snapshot. A torn last line from
+    # an interrupted run is ignored.
+    journal_path = path + '.journal'
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(row, dict) and row.get('key'):
+                    out[str(row['key'])] = _clean_entry(row)
+
+    return JournaledCache(path, out, compact_bytes=compact_bytes)
+
+
+def save_cache(path: str, cache: Dict[str, Dict[str, str]]):
+    save_json(path, cache)
+
+
+def memory_source(words: Dict[str, str]) -> Source:
+    return source_tuple(words.get('de', ''), words.get('en', ''), words.get('fa', ''))
+
+
+def legacy_memory_entries(cache: JournaledCache) -> Iterator[Tuple[Source, str, str]]:
+    """Yield translation-memory rows for every `id|de|en|fa[|ps]` cache entry."""
+    for key, entry in cache.entries.items():
+        parts = key.split('|')
+        if len(parts) not in (4, 5):
+            continue
+        src = source_tuple(parts[1], parts[2], parts[3])
+        for lang, text in entry.items():
+            if text:
+                yield src, lang, text
+
+
+def ensure_words_obj(item: Dict[str, Any]) -> Dict[str, str]:
+    words = item.get('words')
+    if not isinstance(words, dict):
+        words = {}
+        item['words'] = words
+    out: Dict[str, str] = {}
+    for k, v in words.items():
+        out[str(k).strip().lower()] = str(v or '').strip()
+    item['words'] = out
+    return out
+
+
+def translate_chunk(*, api_key: str, model: str, rows: List[Dict[str, Any]], targets: Sequence[str] = DEFAULT_TARGETS, timeout_sec: float, retries: int, retry_backoff_sec: float, session: Optional[ChatSession] = None, budget: Optional[TokenBudget] = None, stream: bool = False, on_row: Optional[Callable[[str, Dict[str, str]], None]] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Translate `rows` and return {key: {lang: text}}. With `stream`, rows are
+    recorded as they arrive (and handed to `on_row`), so a request that dies
+    midway only leaves the unreceived rows for bisection to resend.
+    """
+    results: Dict[str, Dict[str, str]] = {}
+    need = {row['key']: row['need'] for row in rows}
+
+    def merge(key: str, entry: Dict[str, str]):
+        merged = results.setdefault(key, {})
+        new = {}
+        for lang in need.get(key, ()):
+            if not merged.get(lang) and entry.get(lang):
+                merged[lang] = new[lang] = entry[lang]
+        if new and on_row is not None:
+            on_row(key, new)
+
+    def send(batch: List[Dict[str, Any]]):
+        got = translate_batch(
+            api_key=api_key,
+            model=model,
+            rows=batch,
+            targets=targets,
+            timeout_sec=timeout_sec,
+            retries=retries,
+            retry_backoff_sec=retry_backoff_sec,
+            session=session,
+            on_row=merge if stream else None,
+        )
+        for row in batch:
+            if row['key'] in got:
+                merge(row['key'], got[row['key']])
+
+    def missing(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [row for row in batch if not all(results.get(row['key'], {}).get(lang) for lang in row['need'])]
+
+    started = time.monotonic()
+    failed = False
+    try:
+        send(rows)
+    except Exception:
+        failed = True
+
+    if budget is not None:
+        # Missing rows usually mean a truncated or unparseable completion.
+        budget.record(
+            tokens=sum(row_tokens(row, row['need']) for row in rows),
+            latency_sec=time.monotonic() - started,
+            ok=not failed and not missing(rows),
+        )
+
+    extra_calls = bisect_recover(rows, send, missing)
+    if session is not None:
+        session.metrics.count(fallback_calls=extra_calls)
+    return results
+
+
+def iter_chunk_results(chunks: Iterable[Tuple[Any, List[Dict[str, str]]]], *, concurrency: int, **translate_kwargs) -> Iterator[Tuple[Any, Dict[str, Dict[str, str]]]]:
+    """
+    Translate (payload, rows) chunks and yield (payload, results) in chunk
+    order, keeping up to `concurrency` chunks in flight. Chunks are pulled
+    lazily, so an adaptive batch size sees the outcome of earlier requests.
+    """
+    if concurrency <= 1:
+        for payload, rows in chunks:
+            yield payload, translate_chunk(rows=rows, **translate_kwargs)
+        return
+
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = deque()
+        exhausted = False
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < concurrency:
+                nxt = next(chunks, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                payload, rows = nxt
+                in_flight.append((payload, pool.submit(translate_chunk, rows=rows, **translate_kwargs)))
+            if in_flight:
+                payload, fut = in_flight.popleft()
+                yield payload, fut.result()
+
+
+Pending = Tuple[Dict[str, Any], str, Dict[str, str], Tuple[str, ...]]
+
+
+def collect_pending(data: List[Any], cache: JournaledCache, memory: Optional[TranslationMemory] = None, targets: Sequence[str] = DEFAULT_TARGETS, metrics: Optional[RunMetrics] = None, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Tuple[List[Pending], int, int]:
+    """
+    Fill items from the cache and return (still pending items, changed,
+    skipped). Each pending entry is (item, cache key, words, missing targets).
+    What the cache and memory lack may be reused from a near-identical source
+    in `fuzzy`. Items fully served this way count as `metrics` cache hits.
+    Targets still missing after the cache and memory get the German word
+    copied verbatim for items flagged `dont_translate` or listed in `dnt`;
+    the Pashto script's digit, email/URL and all-caps rules only apply to `ps`.
+    """
+    changed = 0
+    skipped = 0
+    pending: List[Pending] = []
+
+    for item in data:
+        if not isinstance(item, dict):
+            skipped += 1
+            continue
+
+        words = ensure_words_obj(item)
+        de = words.get('de', '').strip()
+        if not de:
+            skipped += 1
+            continue
+
+        need = [lang for lang in targets if not words.get(lang, '').strip()]
+        if not need:
+            skipped += 1
+            continue
+
+        key = build_cache_key(item, targets)
+        cached = dict(cache.get(key) or {})
+        if memory is not None and not all(cached.get(lang) for lang in need):
+            cached.update(memory.get_many(memory_source(words), [lang for lang in need if not cached.get(lang)]))
+        for lang in need:
+            text = str(cached.get(lang, '') or '').strip()
+            if text:
+                words[lang] = text
+                changed += 1
+
+        need = [lang for lang in need if not words.get(lang, '').strip()]
+        verbatim = [lang for lang in need if is_non_translatable(de, item, dnt, heuristics=lang == VERBATIM_HEURISTICS_TARGET)]
+        for lang in verbatim:
+            words[lang] = de
+            changed += 1
+        if verbatim:
+            need = [lang for lang in need if lang not in verbatim]
+            if not need:
+                continue
+        if fuzzy is not None and need:
+            reused = fuzzy.reuse(memory_source(words), need)
+            for lang, text in reused.items():
+                words[lang] = text
+                changed += 1
+            if reused:
+                need = [lang for lang in need if lang not in reused]
+                if metrics is not None:
+                    metrics.count(fuzzy_reused=1)
+        if metrics is not None and need:
+            metrics.count(cache_misses=1)
+        elif metrics is not None:
+            metrics.count(cache_hits=1)
+        if need:
+            pending.append((item, key, words, tuple(need)))
+
+    return pending, changed, skipped
+
+
+def iter_chunks(pending: List[Any], rows: List[Dict[str, str]], *, batch_size: int, max_items_left: int, budget: Optional[TokenBudget] = None) -> Iterator[Tuple[List[Any], List[Dict[str, str]]]]:
+    """
+    Cut `pending` (and the matching request `rows`) into batches of
+    `batch_size` items, or by the token budget when one is given.
+    """
+    if max_items_left == 0:
+        max_items_left = 1_000_000_000
+
+    costs = [row_tokens(row, row['need']) for row in rows] if budget is not None else []
+    i = 0
+    while i < len(pending) and max_items_left > 0:
+        n = budget.take(costs, i) if budget is not None else max(1, batch_size)
+        n = min(n, max_items_left)
+        yield pending[i:i + n], rows[i:i + n]
+        i += n
+        max_items_left -= n
+
+
+def count_batches(rows: List[Dict[str, str]], batch_size: int, budget: Optional[TokenBudget] = None) -> int:
+    if budget is not None:
+        return budget.count_batches([row_tokens(row, row['need']) for row in rows])
+    return -(-len(rows) // max(1, batch_size))
+
+
+def build_row(key: str, words: Dict[str, str], need: Sequence[str]) -> Dict[str, Any]:
+    """Request row: the source languages, any other filled language as context, and `need`."""
+    row: Dict[str, Any] = {'key': key}
+    for lang in SOURCE_LANGS:
+        row[lang] = words.get(lang, '')
+    for lang, text in words.items():
+        if lang not in row and lang not in need and text:
+            row[lang] = text
+    row['need'] = list(need)
+    return row
+
+
+def attach_hints(rows: List[Dict[str, Any]], fuzzy: Optional[FuzzyIndex], metrics: Optional[RunMetrics] = None):
+    """Add the closest translated sources to each row as `hints`, when `fuzzy` has any."""
+    if fuzzy is None:
+        return
+    for row in rows:
+        hints = fuzzy.hints(source_tuple(row['de'], row['en'], row['fa']), row['need'])
+        if hints:
+            row['hints'] = hints
+            if metrics is not None:
+                metrics.count(fuzzy_hinted=1)
+
+
+def build_fuzzy_index(*, paths: List[str], cache: JournaledCache, memory: Optional[TranslationMemory] = None, reuse_score: float = DEFAULT_REUSE_SCORE, hint_score: float = 0.0) -> Optional[FuzzyIndex]:
+    """
+    Index the translations already known from `paths` (the files still to be
+    processed) and the cache. The memory is not loaded; the index queries it
+    by folded source when it has no match of its own.
+    """
+    fuzzy = FuzzyIndex(reuse_score=reuse_score, hint_score=hint_score, memory=memory)
+    if not fuzzy.enabled:
+        return None
+    for path in paths:
+        data = load_json(path)
+        for item in data if isinstance(data, list) else []:
+            words = item.get('words') if isinstance(item, dict) else None
+            if isinstance(words, dict):
+                words = {str(k): str(v or '').strip() for k, v in words.items()}
+                fuzzy.add(memory_source(words), {lang: text for lang, text in words.items() if lang not in SOURCE_LANGS})
+    for key, entry in cache.entries.items():
+        parts = key.split('|')
+        if len(parts) in (4, 5):
+            fuzzy.add(source_tuple(parts[1], parts[2], parts[3]), entry)
+    return fuzzy
+
+
+def content_key(row: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Item-independent form of a request row, used to spot repeated rows."""
+    return tuple((k, tuple(v) if isinstance(v, list) else re.sub(r'\s+', ' ', str(v).strip())) for k, v in row.items() if k != 'key')
+
+
+def fill_entry(words: Dict[str, str], need: Sequence[str], result: Dict[str, str]) -> Dict[str, str]:
+    """Apply the non-empty translations for `need` to `words`; return what was new."""
+    new: Dict[str, str] = {}
+    for lang in need:
+        text = str(result.get(lang, '') or '').strip()
+        if text and not words.get(lang, '').strip():
+            words[lang] = text
+            new[lang] = text
+    return new
+
+
+def shared_pending(pending_per_file: List[List[Pending]]) -> List[List[Pending]]:
+    """Groups of pending entries whose request rows are identical, for groups of two or more."""
+    groups: Dict[Tuple[Any, ...], List[Pending]] = {}
+    for pending in pending_per_file:
+        for entry in pending:
+            groups.setdefault(content_key(build_row(entry[1], entry[2], entry[3])), []).append(entry)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def dedupe_corpus(*, paths: List[str], api_key: str, model: str, cache: JournaledCache, targets: Sequence[str] = DEFAULT_TARGETS, batch_size: int, timeout_sec: float, retries: int, retry_backoff_sec: float, max_items_left: int, concurrency: int = 1, session: Optional[ChatSession] = None, memory: Optional[TranslationMemory] = None, budget: Optional[TokenBudget] = None, stream: bool = False, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Tuple[int, int, int]:
+    """
+    Translate request rows that are pending in more than one place once, and
+    fan the result out to the cache key of every item sharing it, so the
+    per-file pass finds them all cached.
+
+    Returns (unique rows sent, items filled, API calls saved).
+    """
+    pending_per_file: List[List[Pending]] = []
+    for path in paths:
+        data = load_json(path)
+        if not isinstance(data, list):
+            continue
+        pending, _, _ = collect_pending(data, cache, memory, targets, fuzzy=fuzzy, dnt=dnt)
+        pending_per_file.append(pending)
+
+    shared = shared_pending(pending_per_file)
+    if not shared:
+        return 0, 0, 0
+
+    # Calls the per-file pass would have made vs. calls with shared rows sent once.
+    shared_ids = {id(entry) for members in shared for entry in members}
+    shared_rows = [build_row(*members[0][1:]) for members in shared]
+    calls_before = sum(count_batches([build_row(*e[1:]) for e in p], batch_size, budget) for p in pending_per_file)
+    calls_after = count_batches(shared_rows, batch_size, budget) + sum(
+        count_batches([build_row(*e[1:]) for e in p if id(e) not in shared_ids], batch_size, budget)
+        for p in pending_per_file
+    )
+    attach_hints(shared_rows, fuzzy, session.metrics if session is not None else None)
+
+    sent = 0
+    filled = 0
+    for chunk, results in iter_chunk_results(
+        iter_chunks(shared, shared_rows, batch_size=batch_size, max_items_left=max_items_left, budget=budget),
+        concurrency=concurrency,
+        api_key=api_key,
+        model=model,
+        targets=targets,
+        timeout_sec=timeout_sec,
+        retries=retries,
+        retry_backoff_sec=retry_backoff_sec,
+        session=session,
+        budget=budget,
+        stream=stream,
+    ):
+        for members in chunk:
+            sent += 1
+            result = results.get(members[0][1], {})
+            new = {lang: result[lang] for lang in members[0][3] if result.get(lang)}
+            if not new:
+                continue
+            for _, key, _, _ in members:
+                cache.merge(key, new)
+                filled += 1
+            if memory is not None:
+                memory.put_many(memory_source(members[0][2]), new)
+            if fuzzy is not None:
+                fuzzy.add(memory_source(members[0][2]), new)
+
+        cache.flush()
+        if memory is not None:
+            memory.commit()
+
+    return sent, filled, max(0, calls_before - calls_after)
+
+
+def process_file(*, path: str, api_key: str, model: str, cache: JournaledCache, targets: Sequence[str] = DEFAULT_TARGETS, batch_size: int, timeout_sec: float, retries: int, retry_backoff_sec: float, max_items_left: int, concurrency: int = 1, session: Optional[ChatSession] = None, memory: Optional[TranslationMemory] = None, budget: Optional[TokenBudget] = None, flush_interval_sec: float = DEFAULT_FLUSH_INTERVAL_SEC, flush_every_batches: int = DEFAULT_FLUSH_EVERY_BATCHES, manifest: Optional[RunManifest] = None, stream: bool = False, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Tuple[int, int, int]:
+    start = manifest.cursor(path) if manifest is not None else 0
+    data = load_json(path)
+    if not isinstance(data, list):
+        return 0, 0, 0
+
+    translated = 0
+    writer = LevelFileWriter(path, data, flush_interval_sec, flush_every_batches)
+    # ensure_words_obj swaps in a new `words` dict, so the originals show
+    # whether normalization or cache hits changed anything.
+    original_words = [item.get('words') if isinstance(item, dict) else None for item in data]
+    metrics = session.metrics if session is not None else None
+    pending, changed, skipped = collect_pending(data, cache, memory, targets, metrics, fuzzy, dnt)
+    if any(isinstance(item, dict) and item.get('words') != before for item, before in zip(data, original_words)):
+        writer.mark_dirty()
+    # Cache hits are applied to the whole file, but an interrupted pass is
+    # resumed at the batch it stopped at; earlier failures wait for the next pass.
+    all_pending = pending
+    position = {id(item): i for i, item in enumerate(data)}
+    pending = [entry for entry in pending if position[id(entry[0])] >= start]
+    rows = [build_row(key, words, need) for item, key, words, need in pending]
+    attach_hints(rows, fuzzy, metrics)
+    # Without a cache or memory, results only survive once the level file is written.
+    durable = bool(cache.path) or memory is not None
+    cursor = start
+    reached_end = not pending
+
+    # Streamed rows are cached the moment they arrive; the level file itself
+    # is only touched from this thread, once the row's batch is done.
+    words_by_key = {key: words for _, key, words, _ in pending}
+
+    def remember(key: str, new: Dict[str, str]):
+        cache.merge(key, new)
+        if memory is not None:
+            memory.put_many(memory_source(words_by_key[key]), new)
+
+    # Requests may complete out of order; results are applied strictly in chunk order.
+    for chunk, results in iter_chunk_results(
+        iter_chunks(pending, rows, batch_size=batch_size, max_items_left=max_items_left, budget=budget),
+        concurrency=concurrency,
+        api_key=api_key,
+        model=model,
+        targets=targets,
+        timeout_sec=timeout_sec,
+        retries=retries,
+        retry_backoff_sec=retry_backoff_sec,
+        session=session,
+        budget=budget,
+        stream=stream,
+        on_row=remember if stream else None,
+    ):
+        for item, key, words, need in chunk:
+            new = fill_entry(words, need, results.get(key, {}))
+            if new:
+                changed += len(new)
+                writer.mark_dirty()
+                cache.merge(key, new)
+                if memory is not None:
+                    memory.put_many(memory_source(words), new)
+                if fuzzy is not None:
+                    fuzzy.add(memory_source(words), new)
+                translated += 1
+
+        # The cache is journaled every batch, so a crash between level-file
+        # flushes only costs a cache replay on the next run.
+        cache.flush()
+        if memory is not None:
+            memory.commit()
+        written = writer.batch_done()
+
+        cursor = position[id(chunk[-1][0])] + 1
+        reached_end = chunk[-1] is pending[-1]
+        if manifest is not None and written:
+            manifest.record(path, complete=False, cursor=cursor)
+        elif manifest is not None and (durable or not writer.dirty):
+            manifest.checkpoint(path, cursor=cursor)
+
+    writer.flush()
+    if manifest is not None:
+        complete = all(words.get(lang, '').strip() for _, _, words, need in all_pending for lang in need)
+        # A pass that reached the end starts over next time to retry its failures.
+        manifest.record(path, complete=complete, cursor=0 if reached_end else cursor)
+    return changed, skipped, translated
+
+
+def batch_tokens(rows: List[Dict[str, Any]], batches: int, targets: Sequence[str]) -> int:
+    """Estimated prompt + completion tokens for sending `rows` in `batches` requests."""
+    return sum(row_tokens(row, row['need']) for row in rows) + batches * estimate_tokens(system_prompt(targets))
+
+
+def plan_batches(rows: List[Dict[str, Any]], batch_size: int, budget: Optional[TokenBudget] = None) -> int:
+    """
+    Batches for `rows`, letting `budget` grow as it would if every request
+    succeeded under the target latency. `budget` is updated in place so the
+    growth carries over between calls, as it does across a run.
+    """
+    if budget is None:
+        return count_batches(rows, batch_size)
+    costs = [row_tokens(row, row['need']) for row in rows]
+    i = 0
+    batches = 0
+    while i < len(costs):
+        n = budget.take(costs, i)
+        budget.record(tokens=sum(costs[i:i + n]), latency_sec=0.0, ok=True)
+        i += n
+        batches += 1
+    return batches
+
+
+def plan_run(*, paths: List[str], cache: JournaledCache, targets: Sequence[str] = DEFAULT_TARGETS, batch_size: int, memory: Optional[TranslationMemory] = None, budget: Optional[TokenBudget] = None, manifest: Optional[RunManifest] = None, dedupe: bool = True, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Dict[str, Any]:
+    """
+    Work out what a run would send without sending anything: per file, the
+    items still pending after the cache and memory, by language, and the
+    batches and estimated tokens under the current batching policy (an
+    adaptive budget is assumed to grow undisturbed). Nothing is written; the
+    level files are only read.
+    """
+    names: List[str] = []
+    pending_per_file: List[List[Pending]] = []
+    for path in paths:
+        data = load_json(path)
+        if not isinstance(data, list):
+            continue
+        pending, _, _ = collect_pending(data, cache, memory, targets, fuzzy=fuzzy, dnt=dnt)
+        # Like process_file, an interrupted pass resumes at its recorded cursor.
+        start = manifest.cursor(path) if manifest is not None else 0
+        if start:
+            position = {id(item): i for i, item in enumerate(data)}
+            pending = [entry for entry in pending if position[id(entry[0])] >= start]
+        names.append(os.path.basename(path))
+        pending_per_file.append(pending)
+
+    shared = shared_pending(pending_per_file) if dedupe else []
+    shared_ids = {id(entry) for members in shared for entry in members}
+    shared_rows = [build_row(*members[0][1:]) for members in shared]
+    attach_hints(shared_rows, fuzzy)
+    total = {'files': 0, 'pending': 0, 'rows': 0, 'batches': 0, 'tokens': 0, 'langs': Counter()}
+    if shared_rows:
+        batches = plan_batches(shared_rows, batch_size, budget)
+        tokens = batch_tokens(shared_rows, batches, targets)
+        print(f'Plan: dedupe rows={len(shared_rows)} items={len(shared_ids)} batches={batches} est_tokens={tokens}')
+        total['rows'] += len(shared_rows)
+        total['batches'] += batches
+        total['tokens'] += tokens
+
+    for name, pending in zip(names, pending_per_file):
+        if not pending:
+            continue
+        langs = Counter(lang for entry in pending for lang in entry[3])
+        rows = [build_row(*entry[1:]) for entry in pending if id(entry) not in shared_ids]
+        attach_hints(rows, fuzzy)
+        batches = plan_batches(rows, batch_size, budget)
+        tokens = batch_tokens(rows, batches, targets)
+        by_lang = ', '.join(f'{lang}={langs[lang]}' for lang in targets if langs[lang])
+        print(f'Plan: {name} pending={len(pending)} ({by_lang}) batches={batches} est_tokens={tokens}')
+        total['files'] += 1
+        total['pending'] += len(pending)
+        total['rows'] += len(rows)
+        total['batches'] += batches
+        total['tokens'] += tokens
+        total['langs'].update(langs)
+    return total
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return 'n/a'
+    seconds = int(round(seconds))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f'{h}h{m:02d}m{s:02d}s' if h else f'{m}m{s:02d}s'
+
+
+def emit_batch_file(*, path: str, paths: List[str], model: str, cache: JournaledCache, targets: Sequence[str] = DEFAULT_TARGETS, batch_size: int, max_items_left: int, memory: Optional[TranslationMemory] = None, budget: Optional[TokenBudget] = None, dedupe: bool = True, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Tuple[int, int]:
+    """
+    Write every pending batch to `path` as Batch API request lines, and the
+    rows behind each custom_id to the sidecar index. Rows pending in several
+    places are sent once and fanned out again on ingest.
+
+    Returns (requests written, rows written).
+    """
+    pending_per_file: List[List[Pending]] = []
+    for p in paths:
+        data = load_json(p)
+        if isinstance(data, list):
+            pending_per_file.append(collect_pending(data, cache, memory, targets, fuzzy=fuzzy, dnt=dnt)[0])
+
+    # Each request row stands for one or more items with the same content.
+    groups = shared_pending(pending_per_file) if dedupe else []
+    shared_ids = {id(entry) for members in groups for entry in members}
+    groups += [[entry] for pending in pending_per_file for entry in pending if id(entry) not in shared_ids]
+    rows = [build_row(*members[0][1:]) for members in groups]
+    attach_hints(rows, fuzzy)
+
+    index: Dict[str, List[Dict[str, Any]]] = {}
+    lines: List[Dict[str, Any]] = []
+    for chunk, chunk_rows in iter_chunks(groups, rows, batch_size=batch_size, max_items_left=max_items_left, budget=budget):
+        custom_id = stable_id('tw', chunk_rows)
+        index[custom_id] = [
+            {
+                'key': members[0][1],
+                'need': list(members[0][3]),
+                'source': list(memory_source(members[0][2])),
+                'also': [entry[1] for entry in members[1:]],
+            }
+            for members in chunk
+        ]
+        body = {'model': model, 'messages': batch_messages(wire_rows(chunk_rows), targets), 'temperature': TEMPERATURE}
+        lines.append(request_line(custom_id, body))
+
+    # The index goes first: a request file is only usable together with it.
+    save_json(index_path(path), {'targets': list(targets), 'model': model, 'requests': index})
+    write_jsonl(path, lines)
+    return len(lines), sum(len(v) for v in index.values())
+
+
+def ingest_batch_results(*, results_path: str, index: Dict[str, Any], cache: JournaledCache, memory: Optional[TranslationMemory] = None) -> Dict[str, int]:
+    """
+    Merge a Batch API output file into the cache (and memory). Only the
+    requested languages of the rows each custom_id was emitted with are taken;
+    rows that came back empty stay pending for the next emit.
+    """
+    targets = index.get('targets') or list(DEFAULT_TARGETS)
+    requests = index.get('requests') or {}
+    stats = {'requests_ok': 0, 'requests_failed': 0, 'unknown_ids': 0, 'rows_filled': 0, 'items_filled': 0, 'rows_missing': 0}
+    seen = set()
+    for custom_id, content, error in read_results(results_path):
+        rows = requests.get(custom_id)
+        if rows is None:
+            stats['unknown_ids'] += 1
+            continue
+        seen.add(custom_id)
+        results: Dict[str, Dict[str, str]] = {}
+        if error is None:
+            try:
+                arr, _ = salvage_json_array(content)
+            except ValueError:
+                arr = []
+                error = 'unparseable content'
+            keys = [row['key'] for row in rows]
+            for row in arr:
+                cleaned = clean_row(row, targets)
+                key = local_key(cleaned[0], keys) if cleaned is not None else None
+                if key is not None:
+                    results[key] = cleaned[1]
+        if error is not None:
+            stats['requests_failed'] += 1
+            stats['rows_missing'] += len(rows)
+            continue
+        stats['requests_ok'] += 1
+        for row in rows:
+            result = results.get(row['key'], {})
+            new = {lang: result[lang] for lang in row['need'] if result.get(lang)}
+            if not new:
+                stats['rows_missing'] += 1
+                continue
+            stats['rows_filled'] += 1
+            for key in [row['key']] + row.get('also', []):
+                cache.merge(key, new)
+                stats['items_filled'] += 1
+            if memory is not None:
+                memory.put_many(source_tuple(*row['source']), new)
+    stats['rows_missing'] += sum(len(rows) for custom_id, rows in requests.items() if custom_id not in seen)
+    cache.flush()
+    if memory is not None:
+        memory.commit()
+    return stats
+
+
+def apply_cached(*, path: str, cache: JournaledCache, targets: Sequence[str] = DEFAULT_TARGETS, memory: Optional[TranslationMemory] = None, manifest: Optional[RunManifest] = None, fuzzy: Optional[FuzzyIndex] = None, dnt: Optional[DoNotTranslate] = None) -> Tuple[int, int, int]:
+    """Fill `path` from the cache and memory only. Returns (changed, skipped, still pending)."""
+    data = load_json(path)
+    if not isinstance(data, list):
+        return 0, 0, 0
+    pending, changed, skipped = collect_pending(data, cache, memory, targets, fuzzy=fuzzy, dnt=dnt)
+    if changed:
+        save_json(path, data)
+    if manifest is not None:
+        manifest.record(path, complete=not pending)
+    return changed, skipped, len(pending)
+
+
+def parse_targets(value: str) -> Tuple[str, ...]:
+    targets: List[str] = []
+    for lang in value.split(','):
+        lang = lang.strip().lower()
+        if lang in SOURCE_LANGS:
+            raise argparse.ArgumentTypeError(f'{lang} is a source language, not a target')
+        if lang and lang not in targets:
+            targets.append(lang)
+    if not targets:
+        raise argparse.ArgumentTypeError('no target languages given')
+    return tuple(targets)
+
+
+def main(*, default_targets: Sequence[str] = DEFAULT_TARGETS, default_cache: str = DEFAULT_CACHE_FILE, default_manifest: str = DEFAULT_MANIFEST_FILE, default_batch: str = DEFAULT_BATCH_FILE):
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--dir', required=True, help='Path to assets/words')
+    ap.add_argument('--targets', type=parse_targets, default=tuple(default_targets), help=f'Comma-separated target languages (default {",".join(default_targets)})')
+    ap.add_argument('--do-not-translate', default=None, help='JSON file with exact/prefix/regex lists of German words to copy verbatim instead of translating')
+    ap.add_argument('--cache', default=None, help=f'JSON cache file (default {default_cache}, off with --memory unless given)')
+    ap.add_argument('--memory', default=None, help='Shared SQLite translation memory, e.g. translation_memory.sqlite3')
+    ap.add_argument('--cache-compact-kb', type=int, default=DEFAULT_JOURNAL_COMPACT_BYTES // 1024, help='Fold the cache journal into the snapshot past this size')
+    ap.add_argument('--api-key-file', default=None)
+    ap.add_argument('--model', default=None, help='OpenAI model, defaults to OPENAI_MODEL or gpt-4.1-mini')
+    ap.add_argument('--batch-size', type=int, default=0, help='Fixed items per request; 0 sizes batches by --token-budget')
+    ap.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='Starting estimated prompt+completion tokens per request')
+    ap.add_argument('--max-batch-items', type=int, default=DEFAULT_MAX_BATCH_ITEMS, help='Upper bound on items per adaptive batch')
+    ap.add_argument('--target-latency', type=float, default=DEFAULT_TARGET_LATENCY_SEC, help='Shrink the token budget when requests get slower than this')
+    ap.add_argument('--max-items', type=int, default=0, help='0 means no limit')
+    ap.add_argument('--timeout', type=float, default=120.0)
+    ap.add_argument('--retries', type=int, default=3)
+    ap.add_argument('--retry-backoff', type=float, default=1.0)
+    ap.add_argument('--rpm', type=float, default=0, help='Requests per minute quota, 0 means unlimited')
+    ap.add_argument('--tpm', type=float, default=0, help='Tokens per minute quota, 0 means unlimited')
+    ap.add_argument('--sleep', type=float, default=0, help='Deprecated and ignored; pacing follows --rpm/--tpm and rate-limit headers')
+    ap.add_argument('--concurrency', type=int, default=1, help='Number of batches kept in flight at once')
+    ap.add_argument('--pool-size', type=int, default=0, help='Max keep-alive HTTP connections, 0 means same as --concurrency')
+    ap.add_argument('--http2', action='store_true', help='Use HTTP/2 (requires httpx[http2])')
+    ap.add_argument('--stream', action='store_true', help='Stream completions and keep every row received before a timeout or disconnect')
+    ap.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL_SEC, help='Write a level file at most every N seconds while translating')
+    ap.add_argument('--flush-batches', type=int, default=DEFAULT_FLUSH_EVERY_BATCHES, help='... or every N batches, whichever comes first')
+    ap.add_argument('--no-dedupe', action='store_true', help='Skip the corpus-wide pass that sends repeated source rows once')
+    ap.add_argument('--fuzzy-reuse', type=float, default=DEFAULT_REUSE_SCORE, help='Reuse the translation of a known source at least this similar (1.0 = same up to case/punctuation; default 0, off)')
+    ap.add_argument('--fuzzy-hints', type=float, default=0, help='Send known sources at least this similar (e.g. 0.6) along with a row as hints, 0 disables')
+    ap.add_argument('--metrics-json', default=None, help='Write a JSON summary of request metrics here at the end of the run')
+    ap.add_argument('--metrics-prom', default=None, help='Write the metrics as a Prometheus textfile (node_exporter textfile collector)')
+    ap.add_argument('--metrics-interval', type=float, default=0, help='Print a JSON metrics snapshot to stderr every N seconds')
+    ap.add_argument('--manifest', default=default_manifest, help='Run manifest used to skip finished files and resume interrupted ones ("" to disable)')
+    ap.add_argument('--rescan', action='store_true', help='Forget the run manifest state and scan every file')
+    ap.add_argument('--plan', action='store_true', help='Print pending items, batches, tokens and projected time, then exit without calling the API')
+    ap.add_argument('--history', default=DEFAULT_HISTORY_FILE, help='Run throughput history that --plan projects from ("" to disable)')
+    ap.add_argument('--batch-file', default=default_batch, help=f'Batch API request file for --batch-emit (default {default_batch}); its index sits next to it')
+    ap.add_argument('--batch-emit', action='store_true', help='Write all pending batches to --batch-file for the Batch API instead of calling the API')
+    ap.add_argument('--batch-ingest', default=None, metavar='RESULTS', help='Apply a Batch API output file for the requests in --batch-file, without calling the API')
+    args = ap.parse_args()
+
+    dnt = load_do_not_translate(args.do_not_translate)
+    for err in dnt.errors:
+        print(f'Warning: skipping invalid do-not-translate regex {err}', file=sys.stderr)
+    if args.plan:
+        plan_main(args, default_cache, dnt)
+        return
+    if args.batch_emit or args.batch_ingest:
+        batch_main(args, default_cache, dnt)
+        return
+
+    api_key = resolve_api_key(args.api_key_file)
+    model = args.model or os.environ.get('OPENAI_MODEL', 'gpt-4.1-mini')
+    memory = TranslationMemory(args.memory) if args.memory else None
+    if memory is not None:
+        legacy_path = args.cache or default_cache
+        if os.path.exists(legacy_path):
+            imported = memory.import_once(legacy_path, lambda: legacy_memory_entries(load_cache(legacy_path)))
+            if imported:
+                print(f'Imported {imported} translations from {legacy_path} into {args.memory}')
+    cache_path = args.cache if args.cache is not None else ('' if memory is not None else default_cache)
+    cache = load_cache(cache_path, compact_bytes=args.cache_compact_kb * 1024)
+    concurrency = max(1, args.concurrency)
+    metrics = RunMetrics(os.path.splitext(os.path.basename(sys.argv[0]))[0])
+    metrics.start_live(args.metrics_interval)
+    session = ChatSession(pool_size=args.pool_size or concurrency, http2=args.http2, limiter=RateLimiter(args.rpm, args.tpm), metrics=metrics)
+    budget = None
+    if args.batch_size <= 0:
+        budget = TokenBudget(args.token_budget, max_items=args.max_batch_items, target_latency_sec=args.target_latency)
+
+    total_changed = 0
+    total_skipped = 0
+    total_translated = 0
+    max_items_left = args.max_items
+    manifest = RunManifest(args.manifest, ','.join(args.targets), reset=args.rescan) if args.manifest else None
+    paths = [os.path.join(args.dir, f) for f in sorted(os.listdir(args.dir)) if f.endswith('.json')]
+    if manifest is not None:
+        paths = [path for path in paths if not manifest.is_complete(path)]
+    fuzzy = build_fuzzy_index(paths=paths, cache=cache, memory=memory, reuse_score=args.fuzzy_reuse, hint_score=args.fuzzy_hints)
+    run_kwargs = dict(
+        api_key=api_key,
+        model=model,
+        cache=cache,
+        targets=args.targets,
+        batch_size=args.batch_size,
+        timeout_sec=args.timeout,
+        retries=args.retries,
+        retry_backoff_sec=args.retry_backoff,
+        concurrency=concurrency,
+        session=session,
+        memory=memory,
+        budget=budget,
+        stream=args.stream,
+        fuzzy=fuzzy,
+        dnt=dnt,
+    )
+
+    if not args.no_dedupe:
+        sent, filled, calls_saved = dedupe_corpus(paths=paths, max_items_left=max_items_left, **run_kwargs)
+        total_translated += sent
+        print(f'Dedupe: unique_rows_sent={sent}, items_filled={filled}, rows_saved={max(0, filled - sent)}, api_calls_saved={calls_saved}')
+        if max_items_left:
+            max_items_left = max(0, max_items_left - sent)
+
+    for path in paths:
+        if args.max_items and max_items_left == 0:
+            break
+        c, s, t = process_file(
+            path=path,
+            max_items_left=max_items_left,
+            flush_interval_sec=args.flush_interval,
+            flush_every_batches=args.flush_batches,
+            manifest=manifest,
+            **run_kwargs,
+        )
+        total_changed += c
+        total_skipped += s
+        total_translated += t
+
+        if max_items_left:
+            max_items_left = max(0, max_items_left - t)
+            if max_items_left == 0:
+                break
+
+    cache.close()
+    if memory is not None:
+        memory.close()
+    session.close()
+    print(f'Done. changed={total_changed}, skipped={total_skipped}, translated={total_translated}')
+    print(session.format_stats())
+    if budget is not None:
+        print(budget.format_stats())
+    if manifest is not None:
+        print(manifest.format_stats())
+    if fuzzy is not None:
+        print(f'Fuzzy: indexed_sources={len(fuzzy)}, items_reused={metrics.counters.get("fuzzy_reused", 0)}, rows_hinted={metrics.counters.get("fuzzy_hinted", 0)}')
+    print(metrics.format_stats())
+    metrics.export(json_path=args.metrics_json, prom_path=args.metrics_prom)
+    metrics.append_history(args.history, targets=list(args.targets), concurrency=concurrency, batch_size=args.batch_size, stream=args.stream)
+
+
+def plan_main(args: argparse.Namespace, default_cache: str, dnt: Optional[DoNotTranslate] = None):
+    """`--plan`: the same file selection and cache lookups as a run, with no API calls and no writes."""
+    memory = TranslationMemory(args.memory, read_only=True) if args.memory and os.path.exists(args.memory) else None
+    cache_path = args.cache if args.cache is not None else ('' if args.memory else default_cache)
+    cache = load_cache(cache_path, compact_bytes=args.cache_compact_kb * 1024)
+    concurrency = max(1, args.concurrency)
+    budget = None
+    if args.batch_size <= 0:
+        budget = TokenBudget(args.token_budget, max_items=args.max_batch_items, target_latency_sec=args.target_latency)
+    # The manifest is only read; it is not saved from here.
+    manifest = RunManifest(args.manifest, ','.join(args.targets), reset=args.rescan) if args.manifest else None
+    paths = [os.path.join(args.dir, f) for f in sorted(os.listdir(args.dir)) if f.endswith('.json')]
+    if manifest is not None:
+        paths = [path for path in paths if not manifest.is_complete(path)]
+    fuzzy = build_fuzzy_index(paths=paths, cache=cache, memory=memory, reuse_score=args.fuzzy_reuse, hint_score=args.fuzzy_hints)
+
+    total = plan_run(
+        paths=paths,
+        cache=cache,
+        targets=args.targets,
+        batch_size=args.batch_size,
+        memory=memory,
+        budget=budget,
+        manifest=manifest,
+        dedupe=not args.no_dedupe,
+        fuzzy=fuzzy,
+        dnt=dnt,
+    )
+    if memory is not None:
+        memory.close()
+
+    history = load_history(args.history)
+    # Throughput depends on how many languages each row asks for.
+    history = [r for r in history if r.get('targets') == list(args.targets)] or history
+    seconds, basis = project_duration(history, rows=total['rows'], requests=total['batches'], concurrency=concurrency, rpm=args.rpm)
+    by_lang = ', '.join(f'{lang}={total["langs"][lang]}' for lang in args.targets)
+    skipped = f', complete_files_skipped={manifest.skipped}' if manifest is not None else ''
+    print(
+        f'Plan total: files={total["files"]}{skipped}, pending={total["pending"]} ({by_lang}), rows_sent={total["rows"]}, '
+        f'batches={total["batches"]}, est_tokens={total["tokens"]}, projected={format_duration(seconds)} ({basis})'
+    )
+
+
+def batch_main(args: argparse.Namespace, default_cache: str, dnt: Optional[DoNotTranslate] = None):
+    """`--batch-emit` / `--batch-ingest`: the two offline halves of a run, for the Batch API."""
+    if args.batch_ingest and not os.path.exists(index_path(args.batch_file)):
+        raise SystemExit(f'{index_path(args.batch_file)} not found: run --batch-emit with --batch-file {args.batch_file} first')
+    memory = TranslationMemory(args.memory) if args.memory else None
+    cache_path = args.cache if args.cache is not None else ('' if memory is not None else default_cache)
+    cache = load_cache(cache_path, compact_bytes=args.cache_compact_kb * 1024)
+    manifest = RunManifest(args.manifest, ','.join(args.targets), reset=args.rescan) if args.manifest else None
+    paths = [os.path.join(args.dir, f) for f in sorted(os.listdir(args.dir)) if f.endswith('.json')]
+    if manifest is not None:
+        paths = [path for path in paths if not manifest.is_complete(path)]
+    fuzzy = build_fuzzy_index(paths=paths, cache=cache, memory=memory, reuse_score=args.fuzzy_reuse, hint_score=args.fuzzy_hints)
+
+    if args.batch_emit:
+        budget = None
+        if args.batch_size <= 0:
+            budget = TokenBudget(args.token_budget, max_items=args.max_batch_items, target_latency_sec=args.target_latency)
+        requests, rows = emit_batch_file(
+            path=args.batch_file,
+            paths=paths,
+            model=args.model or os.environ.get('OPENAI_MODEL', 'gpt-4.1-mini'),
+            cache=cache,
+            targets=args.targets,
+            batch_size=args.batch_size,
+            max_items_left=args.max_items,
+            memory=memory,
+            budget=budget,
+            dedupe=not args.no_dedupe,
+            fuzzy=fuzzy,
+            dnt=dnt,
+        )
+        print(f'Batch emit: requests={requests}, rows={rows}, file={args.batch_file}, index={index_path(args.batch_file)}')
+    else:
+        index = load_json(index_path(args.batch_file))
+        if list(index.get('targets') or []) != list(args.targets):
+            raise SystemExit(f'{index_path(args.batch_file)} was emitted for --targets {",".join(index.get("targets") or [])}')
+        stats = ingest_batch_results(results_path=args.batch_ingest, index=index, cache=cache, memory=memory)
+        total_changed = 0
+        total_pending = 0
+        for path in paths:
+            changed, _, still_pending = apply_cached(path=path, cache=cache, targets=args.targets, memory=memory, manifest=manifest, fuzzy=fuzzy, dnt=dnt)
+            total_changed += changed
+            total_pending += still_pending
+        print('Batch ingest: ' + ', '.join(f'{k}={v}' for k, v in stats.items()))
+        print(f'Done. changed={total_changed}, still_pending={total_pending}')
+
+    cache.close()
+    if memory is not None:
+        memory.close()
+    if manifest is not None:
+        print(manifest.format_stats())
+
+
+if __name__ == '__main__':
+    main()
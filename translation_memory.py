@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+from urllib.request import pathname2url
+
+DEFAULT_MEMORY_FILE = 'translation_memory.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    text TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    folded TEXT,
+    PRIMARY KEY (source, lang)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+Source = Tuple[str, ...]
+
+
+def source_tuple(de: str, en: str, fa: str) -> Source:
+    """Normalized (de, en, fa) tuple used as the language-independent key."""
+    return tuple(re.sub(r'\s+', ' ', str(s or '').strip()) for s in (de, en, fa))
+
+
+def encode_source(source: Source) -> str:
+    return json.dumps(list(source), ensure_ascii=False, separators=(',', ':'))
+
+
+def fold_source(source: Source) -> str:
+    """German and English source folded for matching: lowercase, punctuation and extra spaces dropped."""
+    de, en = (tuple(source) + ('', ''))[:2]
+    return ' | '.join(re.sub(r'\s+', ' ', re.sub(r'[^\w]+', ' ', s.lower())).strip() for s in (de, en))
+
+
+class TranslationMemory:
+    """
+    On-disk translation memory shared by the enrichment scripts.
+
+    Rows are keyed by (source tuple, target language) and read with indexed
+    point lookups, so nothing is loaded up front. The database runs in WAL
+    mode, which lets several runs read and write it at the same time. Each
+    row also stores its folded source (`fold_source`) under an index, so
+    sources that only differ in case or punctuation are point lookups too.
+    With `read_only` the file is opened for lookups only (e.g. for `--plan`).
+    """
+
+    def __init__(self, path: str = DEFAULT_MEMORY_FILE, busy_timeout_ms: int = 30000, *, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            # Lookups only: no schema, migration or commit, so the file is left as it is.
+            uri = 'file:' + pathname2url(os.path.abspath(path)) + '?mode=ro'
+            self._conn = sqlite3.connect(uri, uri=True, timeout=busy_timeout_ms / 1000.0, check_same_thread=False)
+            self._conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+            self._folded = 'folded' in {row[1] for row in self._conn.execute('PRAGMA table_info(translations)')}
+            return
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000.0, check_same_thread=False)
+        self._folded = True
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(translations)')}
+        if 'folded' not in columns:
+            self._conn.execute('ALTER TABLE translations ADD COLUMN folded TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS translations_folded ON translations (folded)')
+        # Rows from before the column existed (or written by an older version).
+        sources = [row[0] for row in self._conn.execute('SELECT DISTINCT source FROM translations WHERE folded IS NULL')]
+        self._conn.executemany(
+            'UPDATE translations SET folded = ? WHERE source = ?',
+            [(fold_source(tuple(json.loads(src))), src) for src in sources],
+        )
+
+    def __enter__(self) -> 'TranslationMemory':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get(self, source: Source, lang: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT text FROM translations WHERE source = ? AND lang = ?',
+                (encode_source(source), lang),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, source: Source, langs: Sequence[str]) -> Dict[str, str]:
+        if not langs:
+            return {}
+        marks = ','.join('?' for _ in langs)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT lang, text FROM translations WHERE source = ? AND lang IN ({marks})',
+                (encode_source(source), *langs),
+            ).fetchall()
+        return {lang: text for lang, text in rows if text}
+
+    def get_folded(self, folded: str, langs: Sequence[str]) -> Dict[str, str]:
+        """Translations for `langs` of any source with this `fold_source` text; the oldest row wins."""
+        if not langs or not self._folded or not folded.replace('|', '').strip():
+            return {}
+        marks = ','.join('?' for _ in langs)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT lang, text FROM translations WHERE folded = ? AND lang IN ({marks}) ORDER BY updated_at',
+                (folded, *langs),
+            ).fetchall()
+        out: Dict[str, str] = {}
+        for lang, text in rows:
+            if text:
+                out.setdefault(lang, text)
+        return out
+
+    def put(self, source: Source, lang: str, text: str) -> None:
+        self.put_many(source, {lang: text})
+
+    def put_many(self, source: Source, translations: Dict[str, str]) -> None:
+        now = time.time()
+        key = encode_source(source)
+        folded = fold_source(source)
+        rows = [(key, lang, text.strip(), now, folded) for lang, text in translations.items() if text and text.strip()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO translations (source, lang, text, updated_at, folded) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(source, lang) DO UPDATE SET text = excluded.text, updated_at = excluded.updated_at',
+                rows,
+            )
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def import_once(self, origin: str, load_entries: Callable[[], Iterable[Tuple[Source, str, str]]]) -> int:
+        """
+        Seed the memory from a legacy cache file. Existing rows win, and the
+        import is skipped when `origin` was already imported at its current
+        size and mtime. `load_entries` is only called (and the file only
+        read) when the import actually runs.
+        """
+        stamp = ''
+        if os.path.exists(origin):
+            st = os.stat(origin)
+            stamp = f'{st.st_size}:{int(st.st_mtime)}'
+        meta_key = 'imported:' + os.path.abspath(origin)
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (meta_key,)).fetchone()
+        if row and row[0] == stamp:
+            return 0
+
+        now = time.time()
+        rows = [(encode_source(src), lang, text.strip(), now, fold_source(src)) for src, lang, text in load_entries() if text and text.strip()]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO translations (source, lang, text, updated_at, folded) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            imported = self._conn.total_changes - before
+            self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (meta_key, stamp))
+            self._conn.commit()
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            if not self.read_only:
+                self._conn.commit()
+            self._conn.close()